@@ -1,201 +1,896 @@
 #Kagan Tek - 20210702027 - Strategic Board Game With AI
 
 # AI player logic using minimax and board evaluation
-from constants import DIRECTIONS
+import json
+import math
+import os
+import time
+
+from batcheval import BatchEvaluator
+from constants import DIRECTIONS, MAX_TURNS
+from bitboard import SIZE, ZOBRIST_AI_TO_MOVE, geometry, weight_planes
+from ordering import MoveOrdering
+from parallel import RootPool, resolve_workers
+from searchstats import SearchStats
+from tablebase import O_WINS, T_WINS
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+# positional weights of the standard board, flattened to bitboard cell indexes
+# every board size has its own table in its Geometry, the evaluation reads the board's unless
+# the weights bring their own 'cells'
+POSITION_WEIGHTS = geometry(SIZE).position_weights
+POSITION_PLANES = geometry(SIZE).position_planes
+
+# evaluation weights: piece difference, mobility, position, capture potential, bonus per move left
+DEFAULT_WEIGHTS = {
+    'piece': 1.0,
+    'mobility': 0.5,
+    'position': 0.7,
+    'capture': 1.5,
+    'endgame': 0.1,
+}
+
+# tuned weights next to the code, written by tune.py and loaded by Game when it is there
+DEFAULT_WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.json')
+
+# deepest iteration tried when searching on a time budget
+MAX_DEPTH = 32
+
+# seconds between progress reports while searching
+PROGRESS_INTERVAL = 0.25
+
+# half width of the first aspiration window around the last iteration's score, a fail widens
+# the failing side 4 times until it passes ASPIRATION_LIMIT and is opened completely
+ASPIRATION_WINDOW = 0.5
+ASPIRATION_LIMIT = 10.0
+
+# quiescence search past the horizon: at most this many capturing turns deep,
+# and QUIESCENCE_NODES turns per leaf in all
+QUIESCENCE_DEPTH = 4
+QUIESCENCE_NODES = 64
+
+# score of a tablebase win, far above any evaluation
+# a win found ply turns below the root, quiescence turns included, scores TABLEBASE_WIN - ply,
+# so any score past TABLEBASE_BOUND is a tablebase result
+TABLEBASE_WIN = 1000.0
+TABLEBASE_BOUND = TABLEBASE_WIN - MAX_DEPTH - QUIESCENCE_DEPTH - 1
+
+
+# a weights file is a json object with any DEFAULT_WEIGHTS entries, numbers, and optionally 'cells',
+# the positional weight of every cell in row-major order, non-negative integers, size * size of them
+def check_weights(weights, size=None):
+    if not isinstance(weights, dict):
+        raise ValueError("Evaluation weights must be a json object")
+    unknown = set(weights) - set(DEFAULT_WEIGHTS) - {'cells'}
+    if unknown:
+        raise ValueError(f"Unknown evaluation weights: {', '.join(sorted(unknown))}")
+    for name in DEFAULT_WEIGHTS:
+        if name in weights and (not isinstance(weights[name], (int, float)) or isinstance(weights[name], bool)):
+            raise ValueError(f"Evaluation weight {name} must be a number, got {weights[name]!r}")
+    cells = weights.get('cells')
+    if cells is None:
+        return
+    if not isinstance(cells, list) or any(not isinstance(w, int) or isinstance(w, bool) or w < 0 for w in cells):
+        raise ValueError("Cell weights must be a list of non-negative integers")
+    if size is not None and len(cells) != size * size:
+        raise ValueError(f"{len(cells)} cell weights for a {size}x{size} board")
+
+
+# weights files are for the standard board size
+def load_weights(path=DEFAULT_WEIGHTS_FILE, size=SIZE):
+    with open(path) as f:
+        weights = json.load(f)
+    check_weights(weights, size)
+    return weights
+
+
+# written to a temporary file first so a reader never sees half a file
+def save_weights(weights, path=DEFAULT_WEIGHTS_FILE, size=SIZE):
+    check_weights(weights, size)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(weights, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+# raised inside the search when the time budget runs out
+class SearchTimeout(Exception):
+    pass
+
 
 class AI:
-    def __init__(self, board, game, depth=3):
-        # setup ai with board and search depth
+    def __init__(self, board, game, depth=2, verify=False, tt_entries=1 << 16, time_budget_ms=None, max_depth=MAX_DEPTH,
+                 eval_cache_entries=1 << 18, workers=None, piece='T', weights=None, stats=False,
+                 ordering=True, batch_eval=False, book=None, tablebase=None, pvs=True, aspiration=True,
+                 quiescence=True, quiescence_nodes=QUIESCENCE_NODES):
+        # setup ai with board and search depth, depth counts whole turns (both moves of a side)
+        # verify checks every make/unmake against a full board snapshot and every evaluation
+        # against a from-scratch grid scan (slow, for debugging)
+        # tt_entries caps the transposition table, 0 turns it off
+        # eval_cache_entries caps the leaf evaluation cache, 0 turns it off
+        # workers spreads root turns over that many processes, "auto" uses every core
+        # piece is the side the ai plays, scores are always from T's point of view
+        # weights overrides entries of DEFAULT_WEIGHTS, its 'cells' replaces the board's positional weights
+        # time_budget_ms switches from fixed depth to iterative deepening within that many ms per turn
+        # stats collects a SearchStats for every play_turn (small cost, off by default)
+        # ordering tries captures, killer turns and turns with a good history first
+        # batch_eval scores all leaves of a last-ply node in one numpy batch, it needs numpy and
+        # quiescence=False, quiescence is on by default and searches on past those leaves
+        # book is an OpeningBook whose turns are played without searching
+        # tablebase is an EndgameTable, positions with few enough pieces get its exact result
+        # batch_eval and tablebase only handle the standard board size
+        # pvs searches all but the first turn of a node with a null window first (principal variation search)
+        # aspiration starts every iterative deepening iteration with a narrow window around the last score
+        # quiescence keeps searching capturing turns at the horizon, quiescence_nodes caps it per leaf
+        if (batch_eval or tablebase is not None) and board.size != SIZE:
+            raise ValueError(f"batch evaluation and the tablebase need a {SIZE}x{SIZE} board")
+        if batch_eval and quiescence:
+            raise ValueError("batch evaluation scores the leaves as they are, it needs quiescence=False")
         self.board = board
         self.game = game
         self.depth = depth
+        self.verify = verify
+        self.piece = piece
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        check_weights(self.weights, board.size)
+        cells = self.weights.get('cells')
+        if cells is None:
+            self.position_weights = geometry(board.size).position_weights
+            self.position_planes = geometry(board.size).position_planes
+        else:
+            self.position_weights = list(cells)
+            self.position_planes = weight_planes(self.position_weights)
+        self.tt = TranspositionTable(tt_entries) if tt_entries else None
+        self.tt_entries = tt_entries
+        self.eval_cache = {} if eval_cache_entries else None  # zobrist hash -> evaluate_board score
+        self.eval_cache_entries = eval_cache_entries
+        self.tt_moves = None  # total_moves the table entries were searched at
+        self.time_budget_ms = time_budget_ms
+        self.max_depth = max_depth
+        self.deadline = None
+        self.turn_deadline = None  # deadline of the whole turn, deadline is None while depth 1 runs
+        self.nodes = 0
+        self.next_poll = 0  # node count at which the search next checks the clock
+        self.completed_depth = 0
+        self.pv = []
+        self.workers = resolve_workers(workers)
+        self.pool = None  # started on the first search that uses it
+        self.stats = SearchStats() if stats else None
+        self.ordering = MoveOrdering() if ordering else None
+        self.batch = BatchEvaluator(self.position_weights, self.weights) if batch_eval else None
+        self.book = book
+        self.tablebase = tablebase
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.quiescence = quiescence
+        self.quiescence_nodes = quiescence_nodes
+        self.q_left = 0  # quiescence turns the current leaf may still search
+        self.root_depth = 0  # depth of the running root search, ply = root_depth - depth
+        self.root_best = (None, None)  # best (turn, score) of the running root search so far
+        self.progress = None  # called with a progress dict now and then while searching
+        self.stopped = False  # set by stop(), possibly from another thread
+        self.turn_started = 0.0
+        self.turn_nodes = 0
+        self.last_report = 0.0
 
     def play_turn(self):
-        ai_pieces = [(x, y) for x in range(self.board.size) 
-                    for y in range(self.board.size) 
-                    if self.board.grid[x][y] == 'T']
-        moves_made = 0
-        moved_pieces = set()  # track moved pieces
-
-        while moves_made < 2 and ai_pieces:
-            best_score = float('-inf')
-            best_move = None
-            best_piece = None
-            
-            # find best move for each piece
-            for x, y in ai_pieces:
-                if (x, y) not in moved_pieces:  # only consider unmoved pieces
-                    direction = self.find_best_move(x, y)
-                    if direction:
-                        original_state = self.snapshot_board()
-                        self.board.move_piece(x, y, direction)
-                        score = self.evaluate_board()
-                        self.restore_board(original_state)
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_move = direction
-                            best_piece = (x, y)
-            
-            # make the best move found
-            if best_piece and best_move:
-                self.board.move_piece(best_piece[0], best_piece[1], best_move)
-                moved_pieces.add(best_piece)  # add to moved pieces
-                ai_pieces.remove(best_piece)
-                moves_made += 1
-                
-                if self.board.circle == 0:
-                    self.game.gui.game_over("AI wins!")
-                    return
-                    
-                remaining_pieces = [(x, y) for x, y in ai_pieces 
-                                  if (x, y) not in moved_pieces]
-                if not remaining_pieces:
-                    break
+        best_turn = self.choose_turn()
+        self.apply_turn(best_turn)
+        return best_turn
+
+    # search the board for the turn to play without playing it
+    # ponder searches with no time limit until stopped or until ponder_hit starts the clock
+    def choose_turn(self, ponder=False):
+        self.prepare_tables()
+        self.stopped = False
+        self.root_best = (None, None)
+        self.completed_depth = 0
+        self.turn_started = self.last_report = time.perf_counter()
+        self.turn_nodes = self.nodes
+        if self.stats is not None:
+            self.stats.begin(self)
+        # opening positions are answered from the book without searching
+        best_turn = self.book.lookup(self.board, self.piece) if self.book is not None else None
+        if best_turn is None:
+            best_turn = self.search_turn(ponder)
+        if self.stats is not None:
+            self.stats.finish(self)
+        return best_turn
+
+    def search_turn(self, ponder):
+        if ponder:
+            # a fixed depth ai stops at its depth, so a hit can be answered at once
+            max_depth = self.max_depth if self.time_budget_ms else self.depth
+            best_turn, _ = self.iterative_deepening(float('inf'), max_depth)
+        elif self.time_budget_ms:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+            best_turn, _ = self.iterative_deepening(deadline)
+        else:
+            started, nodes = time.perf_counter(), self.nodes
+            state = self.snapshot_board()
+            try:
+                best_turn, score = self.search_root(self.depth)
+            except SearchTimeout:
+                self.restore_board(state)
+                best_turn, score = None, None
+            if self.stats is not None:
+                self.stats.iteration(self.depth, started, self.nodes - nodes, score, completed=best_turn is not None)
+        if best_turn is None:
+            # stopped before a search finished, take the best root turn seen so far
+            best_turn = self.root_best[0]
+            if best_turn is None:
+                best_turn = self.board.legal_turns(self.piece)[0]
+        return best_turn
+
+    # make the moves of a turn on the board, the game checks for the end
+    def apply_turn(self, turn):
+        for src, dst in turn or ():
+            x, y = divmod(src, self.board.size)
+            new_x, new_y = divmod(dst, self.board.size)
+            self.board.move_piece_by_coords(x, y, new_x, new_y)
+
+    # end the running search as soon as possible, it then returns the best turn found so far
+    # safe to call from another thread
+    def stop(self):
+        self.stopped = True
+
+    # the human played the reply a ponder search was started for, the time already spent pondering
+    # counts towards the usual budget, so a long ponder answers at once with what it has
+    # safe to call from another thread
+    def ponder_hit(self):
+        if self.time_budget_ms:
+            self.turn_deadline = max(time.perf_counter(), self.turn_started + self.time_budget_ms / 1000)
+            if self.deadline is not None:
+                self.deadline = self.turn_deadline
+
+    # the human turn the last search expects after the ai's turn was played on the board, or None
+    def expected_reply(self):
+        if self.tt is None:
+            return None
+        opponent = 'O' if self.piece == 'T' else 'T'
+        key = self.board.hash if opponent == 'O' else self.board.hash ^ ZOBRIST_AI_TO_MOVE
+        entry = self.tt.probe(key)
+        if entry is None or entry[4] is None or entry[4] not in self.board.legal_turns(opponent):
+            return None
+        return entry[4]
+
+    # called every 512 nodes: give up when stopped or out of time, and report progress now and then
+    def poll_search(self):
+        self.next_poll = self.nodes + 512
+        now = time.perf_counter()
+        if self.stopped or (self.deadline is not None and now > self.deadline):
+            raise SearchTimeout()
+        if self.progress is not None and now - self.last_report > PROGRESS_INTERVAL:
+            self.report_progress(now)
+
+    def report_progress(self, now=None):
+        now = now or time.perf_counter()
+        self.last_report = now
+        turn, score = self.root_best
+        elapsed = now - self.turn_started
+        nodes = self.nodes - self.turn_nodes
+        size = self.board.size
+        self.progress({
+            'depth': self.root_depth,
+            'completed_depth': self.completed_depth,
+            'best_turn': [(divmod(src, size), divmod(dst, size)) for src, dst in turn or ()],
+            'score': score,
+            'nodes': nodes,
+            'nodes_per_s': nodes / elapsed if elapsed else 0.0,
+            'elapsed_ms': elapsed * 1000,
+        })
+
+    # best (turn, score) for the ai, a turn is searched to depth whole turns
+    # T picks the highest score and O the lowest, ties go to the first turn generated
+    # with a narrower window than (-inf, inf) a score at or outside it is only a bound,
+    # the parallel search always uses the full window
+    def search_root(self, depth, parallel=True, alpha=float('-inf'), beta=float('inf')):
+        if parallel and depth > 1 and (self.workers > 1 or self.pool is not None):
+            if self.pool is None:
+                self.pool = RootPool(self.workers, {'tt_entries': self.tt_entries,
+                                                'eval_cache_entries': self.eval_cache_entries,
+                                                'piece': self.piece, 'weights': self.weights,
+                                                'batch_eval': self.batch is not None,
+                                                'tablebase': self.tablebase, 'pvs': self.pvs,
+                                                'quiescence': self.quiescence,
+                                                'quiescence_nodes': self.quiescence_nodes},
+                                     self.board.size)
+            return self.pool.search(self, depth)
+        self.root_depth = depth
+        maximizing = self.piece == 'T'
+        best_score = float('-inf') if maximizing else float('inf')
+        best_turn = None
+        # with ordering the last best root turn and the captures go first, a turn generated before
+        # the best so far gets a window one float wider, so a tie is seen and goes to it as before
+        turns = self.board.legal_turns(self.piece)
+        generated = {turn: index for index, turn in enumerate(turns)}
+        if self.ordering is not None:
+            turns = self.ordering.order(self.board, self.piece, 0, self.root_best[0])
+        for index, turn in enumerate(turns):
+            earlier = best_turn is not None and generated[turn] < generated[best_turn]
+            undos = self.make_turn(turn)
+            if earlier and maximizing and alpha == best_score:
+                score = self.search_child(depth - 1, False, math.nextafter(alpha, float('-inf')), beta, False)
+            elif earlier and not maximizing and beta == best_score:
+                score = self.search_child(depth - 1, True, alpha, math.nextafter(beta, float('inf')), False)
             else:
+                score = self.search_child(depth - 1, not maximizing, alpha, beta, index == 0)
+            self.unmake_turn(undos)
+
+            if maximizing:
+                if score > best_score or (earlier and score == best_score):
+                    best_score = score
+                    best_turn = turn
+                    self.root_best = (turn, score)
+                alpha = max(alpha, score)
+            else:
+                if score < best_score or (earlier and score == best_score):
+                    best_score = score
+                    best_turn = turn
+                    self.root_best = (turn, score)
+                beta = min(beta, score)
+            if beta <= alpha:
                 break
+        return best_turn, best_score
 
+    # search the root in a window around guess, the last iteration's score, and widen the side
+    # that fails until the score lands inside, turn and score are then the full window ones
+    def aspiration_search(self, depth, guess):
+        low = high = ASPIRATION_WINDOW
+        while True:
+            alpha = guess - low if low <= ASPIRATION_LIMIT else float('-inf')
+            beta = guess + high if high <= ASPIRATION_LIMIT else float('inf')
+            turn, score = self.search_root(depth, alpha=alpha, beta=beta)
+            if score <= alpha and alpha != float('-inf'):
+                low *= 4
+            elif score >= beta and beta != float('inf'):
+                high *= 4
+            else:
+                return turn, score
+            if self.stats is not None:
+                self.stats.aspiration_fails += 1
 
-    # evaluation determines the piece count, positional advantage, mobility, capture probability and moves remaining and acts accordingly.
-    
-    def find_best_move(self, x, y):
-        best_score = float('-inf')
-        best_direction = None
-        for direction, (dx, dy) in DIRECTIONS.items():
-            if self.board.is_valid_move(x, y, x + dx, y + dy):
-                original_state = self.snapshot_board()
-                self.board.move_piece(x, y, direction)
-                score = self.minimax(self.depth, is_maximizing=False)
-                self.restore_board(original_state)
+    # stop the worker processes of a parallel search
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
 
-                if score > best_score:
-                    best_score = score
-                    best_direction = direction
+    # search depth 1, 2, ... until the deadline and keep the result of the last completed depth
+    # the transposition table carries each iteration's best turns (the principal variation) into the next one
+    # max_depth defaults to the ai's max_depth, the deadline can be moved while this runs (ponder_hit)
+    def iterative_deepening(self, deadline, max_depth=None):
+        result = (None, float('-inf') if self.piece == 'T' else float('inf'))
+        self.turn_deadline = deadline
+        self.deadline = None  # depth 1 always finishes so there is a move to play
+        for depth in range(1, (max_depth or self.max_depth) + 1):
+            started, nodes = time.perf_counter(), self.nodes
+            state = self.snapshot_board()
+            try:
+                if self.aspiration and depth > 1 and self.pool is None and self.workers == 1:
+                    result = self.aspiration_search(depth, result[1])
+                else:
+                    result = self.search_root(depth)
+            except SearchTimeout:
+                self.restore_board(state)
+                if self.stats is not None:
+                    self.stats.iteration(depth, started, self.nodes - nodes, None, completed=False)
+                break
+            finally:
+                self.deadline = self.turn_deadline
+            if self.stats is not None:
+                self.stats.iteration(depth, started, self.nodes - nodes, result[1])
+            self.completed_depth = depth
+            self.pv = self.principal_variation(result[0], depth)
+            if self.progress is not None:
+                self.report_progress()
+            # the next depth takes longer than this one, don't start it if it can't finish
+            now = time.perf_counter()
+            if not result[0] or now + (now - started) > self.turn_deadline:
+                break
+        self.deadline = None
+        self.turn_deadline = None
+        return result
 
-        return best_direction
+    # turns the search expects to be played from the current position, read back from the table
+    def principal_variation(self, turn, depth):
+        pv = []
+        undos = []
+        is_maximizing = self.piece != 'T'
+        while turn is not None and len(pv) < depth:
+            pv.append(turn)
+            undos.append(self.board.make_turn(turn))
+            if self.tt is None:
+                break
+            key = self.board.hash ^ ZOBRIST_AI_TO_MOVE if is_maximizing else self.board.hash
+            entry = self.tt.probe(key)
+            turn = entry[4] if entry is not None else None
+            is_maximizing = not is_maximizing
+        for undo in reversed(undos):
+            self.board.unmake_turn(undo)
+        size = self.board.size
+        return [[(divmod(src, size), divmod(dst, size)) for src, dst in turn] for turn in pv]
+
+    # evaluation determines the piece count, positional advantage, mobility, capture probability and moves remaining and acts accordingly.
 
     def snapshot_board(self):
         return {
-            'grid': [row[:] for row in self.board.grid],
+            't': self.board.t,
+            'o': self.board.o,
+            'hash': self.board.hash,
             'triangle': self.board.triangle,
             'circle': self.board.circle
         }
 
+    # roll back a search that was stopped halfway
     def restore_board(self, state):
-        self.board.grid = state['grid']
+        self.board.t = state['t']
+        self.board.o = state['o']
+        self.board.hash = state['hash']
         self.board.triangle = state['triangle']
         self.board.circle = state['circle']
 
+    # scores include the move count bonus, so entries from an earlier turn are stale
+    def prepare_tables(self):
+        total_moves = self.game.return_total_moves()
+        if self.tt_moves != total_moves:
+            if self.tt is not None:
+                self.tt.clear()
+            if self.eval_cache is not None:
+                self.eval_cache.clear()
+            if self.ordering is not None:
+                self.ordering.new_turn()
+            self.tt_moves = total_moves
+
+    # look up a node before expanding it, returns (score or None, alpha, beta, best turn)
+    # entries only cut off at the same depth, so the table never changes the search result
+    def probe_tt(self, key, depth, alpha, beta):
+        entry = self.tt.probe(key)
+        if entry is None:
+            return None, alpha, beta, None
+        if entry[1] == depth:
+            score, bound = self.from_tt(entry[2], depth), entry[3]
+            if bound == EXACT:
+                return score, alpha, beta, entry[4]
+            if bound == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if beta <= alpha:
+                return score, alpha, beta, entry[4]
+        return None, alpha, beta, entry[4]
+
+    def store_tt(self, key, depth, score, alpha, beta, best_move):
+        if score <= alpha:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, self.to_tt(score, depth), bound, best_move)
+
+    # tablebase scores count plies from the root, the table keeps them counted from the node
+    # instead, so an entry reached again at another ply or in a later iteration stays right
+    def to_tt(self, score, depth):
+        if score > TABLEBASE_BOUND:
+            return score + (self.root_depth - depth)
+        if score < -TABLEBASE_BOUND:
+            return score - (self.root_depth - depth)
+        return score
+
+    def from_tt(self, score, depth):
+        if score > TABLEBASE_BOUND:
+            return score - (self.root_depth - depth)
+        if score < -TABLEBASE_BOUND:
+            return score + (self.root_depth - depth)
+        return score
+
+    # search moves are played in place and taken back from the undo record
+    def make_move(self, src, dst):
+        if self.verify:
+            state = self.snapshot_board()
+            undo = self.board.make_move(src, dst)
+            if self.board.hash != self.board.compute_hash():
+                raise AssertionError(f"incremental hash went wrong after {undo}")
+            return state, undo
+        return self.board.make_move(src, dst)
+
+    def unmake_move(self, undo):
+        if self.verify:
+            state, undo = undo
+            self.board.unmake_move(undo)
+            if self.snapshot_board() != state:
+                raise AssertionError(f"unmake_move did not restore the board after {undo}")
+            return
+        self.board.unmake_move(undo)
+
+    def make_turn(self, turn):
+        if self.verify:
+            return [self.make_move(src, dst) for src, dst in turn]
+        return self.board.make_turn(turn)
+
+    def unmake_turn(self, undos):
+        if self.verify:
+            for undo in reversed(undos):
+                self.unmake_move(undo)
+            return
+        self.board.unmake_turn(undos)
+
+    # turns in search order, the table's best turn goes first
+    def ordered_turns(self, piece, best_turn, depth):
+        if self.ordering is not None:
+            return self.ordering.order(self.board, piece, self.root_depth - depth, best_turn)
+        turns = self.board.legal_turns(piece)
+        if best_turn is not None and best_turn in turns and turns[0] != best_turn:
+            turns.remove(best_turn)
+            turns.insert(0, best_turn)
+        return turns
+
+    # turns of a node whose children are leaves, each yielded while it is played on the board
+    def leaf_turns(self, piece, best_turn, depth):
+        if self.ordering is not None:
+            return self.ordering.leaf_turns(self.board, piece, self.root_depth - depth, best_turn)
+        return self.board.iter_turns(piece)
+
     def minimax(self, depth, is_maximizing, alpha=float('-inf'), beta=float('inf')):
-        if depth == 0 or self.is_terminal():
+        self.nodes += 1
+        if self.nodes >= self.next_poll:
+            self.poll_search()
+        score = self.tablebase_score(self.root_depth - depth, is_maximizing)
+        if score is not None:
+            return score
+        if self.is_terminal():
             return self.evaluate_board()
+        if depth == 0:
+            return self.leaf_score(is_maximizing, alpha, beta)
 
         if is_maximizing:
             return self.maximize(depth, alpha, beta)
         else:
             return self.minimize(depth, alpha, beta)
 
+    # principal variation search: the first turn of a node gets the whole window, every later turn
+    # a null window that only asks whether it beats the best score so far, and a full search when it does
+    # the null window is one float wide, so the answer is exact and ties are never re-searched
+    def search_child(self, depth, is_maximizing, alpha, beta, first):
+        if first or not self.pvs:
+            return self.minimax(depth, is_maximizing, alpha, beta)
+        if is_maximizing:
+            score = self.minimax(depth, True, math.nextafter(beta, float('-inf')), beta)
+        else:
+            score = self.minimax(depth, False, alpha, math.nextafter(alpha, float('inf')))
+        if alpha < score < beta:
+            if self.stats is not None:
+                self.stats.researches += 1
+            score = self.minimax(depth, is_maximizing, alpha, beta)
+        return score
+
+    # exact score of the position ply turns below the root from the tablebase, sooner wins score higher
+    # None when there is no tablebase or too many pieces are left, every node and leaf asks here first
+    def tablebase_score(self, ply, is_maximizing):
+        if self.tablebase is None or self.board.triangle + self.board.circle > self.tablebase.max_pieces:
+            return None
+        turns_left = MAX_TURNS - self.game.return_total_moves() - ply
+        result = self.tablebase.probe(self.board, 'T' if is_maximizing else 'O', turns_left)
+        if result is None:
+            return None
+        if result == T_WINS:
+            return TABLEBASE_WIN - ply
+        if result == O_WINS:
+            return ply - TABLEBASE_WIN
+        # a draw is worth what the evaluation gives a level position, the endgame bonus and nothing else
+        return self.endgame_bonus()
+
+    # one ply is a whole turn of the side to move
+    # at depth 1 the children are leaves, so they are scored while the turn generator has them on the board
     def maximize(self, depth, alpha, beta):
+        best_turn = None
+        if self.tt is not None:
+            key = self.board.hash ^ ZOBRIST_AI_TO_MOVE
+            score, alpha, beta, best_turn = self.probe_tt(key, depth, alpha, beta)
+            if score is not None:
+                if self.stats is not None:
+                    self.stats.tt_cutoffs += 1
+                return score
+            alpha_start = alpha
         max_eval = float('-inf')
-        ai_pieces = [(x, y) for x in range(self.board.size) for y in range(self.board.size) if self.board.grid[x][y] == 'T']
-        for x, y in ai_pieces:
-            for direction, (dx, dy) in DIRECTIONS.items():
-                if self.board.is_valid_move(x, y, x + dx, y + dy):
-                    original_state = self.snapshot_board()
-                    self.board.move_piece(x, y, direction)
-
-                    eval_ = self.minimax(depth - 1, False, alpha, beta)
-
-                    self.restore_board(original_state)
-                    max_eval = max(max_eval, eval_)
-                    alpha = max(alpha, eval_)
-                    if beta <= alpha:
-                        return max_eval
+        searched = 0
+        if depth == 1 and self.batch is not None:
+            max_eval, best_turn, alpha, beta, searched = self.batch_leaf_node('T', alpha, beta, best_turn, depth)
+        elif depth == 1:
+            pieces = self.board.triangle + self.board.circle
+            turns = self.leaf_turns('T', best_turn, depth)
+            for searched, turn in enumerate(turns, 1):
+                self.nodes += 1
+                eval_ = self.leaf_score(False, alpha, beta)
+                if eval_ > max_eval:
+                    max_eval = eval_
+                    best_turn = turn
+                alpha = max(alpha, eval_)
+                if beta <= alpha:
+                    if self.ordering is not None and self.board.triangle + self.board.circle == pieces:
+                        self.ordering.cutoff('T', self.root_depth - depth, depth, turn)
+                    break
+            turns.close()
+        else:
+            pieces = self.board.triangle + self.board.circle
+            for searched, turn in enumerate(self.ordered_turns('T', best_turn, depth), 1):
+                undos = self.make_turn(turn)
+                quiet = self.board.triangle + self.board.circle == pieces
+
+                eval_ = self.search_child(depth - 1, False, alpha, beta, searched == 1)
+
+                self.unmake_turn(undos)
+                if eval_ > max_eval:
+                    max_eval = eval_
+                    best_turn = turn
+                alpha = max(alpha, eval_)
+                if beta <= alpha:
+                    if quiet and self.ordering is not None:
+                        self.ordering.cutoff('T', self.root_depth - depth, depth, turn)
+                    break
+        if self.stats is not None:
+            self.stats.searched(searched, beta <= alpha)
+        if self.tt is not None:
+            self.store_tt(key, depth, max_eval, alpha_start, beta, best_turn)
         return max_eval
 
     def minimize(self, depth, alpha, beta):
+        best_turn = None
+        if self.tt is not None:
+            key = self.board.hash
+            score, alpha, beta, best_turn = self.probe_tt(key, depth, alpha, beta)
+            if score is not None:
+                if self.stats is not None:
+                    self.stats.tt_cutoffs += 1
+                return score
+            beta_start = beta
         min_eval = float('inf')
-        human_pieces = [(x, y) for x in range(self.board.size) for y in range(self.board.size) if self.board.grid[x][y] == 'O']
-        for x, y in human_pieces:
-            for direction, (dx, dy) in DIRECTIONS.items():
-                if self.board.is_valid_move(x, y, x + dx, y + dy):
-                    original_state = self.snapshot_board()
-                    self.board.move_piece(x, y, direction)
-
-                    eval_ = self.minimax(depth - 1, True, alpha, beta)
-
-                    self.restore_board(original_state)
-                    min_eval = min(min_eval, eval_)
-                    beta = min(beta, eval_)
-                    if beta <= alpha:
-                        return min_eval
+        searched = 0
+        if depth == 1 and self.batch is not None:
+            min_eval, best_turn, alpha, beta, searched = self.batch_leaf_node('O', alpha, beta, best_turn, depth)
+        elif depth == 1:
+            pieces = self.board.triangle + self.board.circle
+            turns = self.leaf_turns('O', best_turn, depth)
+            for searched, turn in enumerate(turns, 1):
+                self.nodes += 1
+                eval_ = self.leaf_score(True, alpha, beta)
+                if eval_ < min_eval:
+                    min_eval = eval_
+                    best_turn = turn
+                beta = min(beta, eval_)
+                if beta <= alpha:
+                    if self.ordering is not None and self.board.triangle + self.board.circle == pieces:
+                        self.ordering.cutoff('O', self.root_depth - depth, depth, turn)
+                    break
+            turns.close()
+        else:
+            pieces = self.board.triangle + self.board.circle
+            for searched, turn in enumerate(self.ordered_turns('O', best_turn, depth), 1):
+                undos = self.make_turn(turn)
+                quiet = self.board.triangle + self.board.circle == pieces
+
+                eval_ = self.search_child(depth - 1, True, alpha, beta, searched == 1)
+
+                self.unmake_turn(undos)
+                if eval_ < min_eval:
+                    min_eval = eval_
+                    best_turn = turn
+                beta = min(beta, eval_)
+                if beta <= alpha:
+                    if quiet and self.ordering is not None:
+                        self.ordering.cutoff('O', self.root_depth - depth, depth, turn)
+                    break
+        if self.stats is not None:
+            self.stats.searched(searched, beta <= alpha)
+        if self.tt is not None:
+            self.store_tt(key, depth, min_eval, alpha, beta_start, best_turn)
         return min_eval
 
-    def evaluate_board(self):
-        piece_diff = self.board.triangle - self.board.circle
-        ai_mobility = self.calculate_mobility('T')
-        human_mobility = self.calculate_mobility('O')
-        mobility_score = ai_mobility - human_mobility
+    # score of a position at the horizon, the tablebase result when it has one, with quiescence it is
+    # searched on until no capture is pending
+    def leaf_score(self, is_maximizing, alpha, beta):
+        if not self.quiescence:
+            score = self.tablebase_score(self.root_depth, is_maximizing)
+            return self.evaluate_board() if score is None else score
+        self.q_left = self.quiescence_nodes
+        return self.quiesce(is_maximizing, alpha, beta, QUIESCENCE_DEPTH)
+
+    # the side to move either stands pat on the evaluation or plays a capturing turn, so a capture
+    # sequence running past the horizon is played out before the position is scored
+    def quiesce(self, is_maximizing, alpha, beta, depth):
+        score = self.tablebase_score(self.root_depth + QUIESCENCE_DEPTH - depth, is_maximizing)
+        if score is not None:
+            return score
+        stand_pat = self.evaluate_board()
+        if depth == 0 or self.q_left <= 0 or self.is_terminal():
+            return stand_pat
+        if is_maximizing:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+        best = stand_pat
+        for turn in self.capture_turns('T' if is_maximizing else 'O'):
+            if self.q_left <= 0:
+                break
+            self.q_left -= 1
+            self.nodes += 1
+            if self.stats is not None:
+                self.stats.qnodes += 1
+            undos = self.make_turn(turn)
+            score = self.quiesce(not is_maximizing, alpha, beta, depth - 1)
+            self.unmake_turn(undos)
+            if is_maximizing:
+                best = max(best, score)
+                alpha = max(alpha, score)
+            else:
+                best = min(best, score)
+                beta = min(beta, score)
+            if beta <= alpha:
+                break
+        return best
 
-        ai_pos_score = self.calculate_positional_advantage('T')
-        human_pos_score = self.calculate_positional_advantage('O')
-        positional_advantage = ai_pos_score - human_pos_score
+    # turns searched by quiesce: a capturing move, then a capturing move by another piece
+    # when there is one, a quiet second move is not searched
+    def capture_turns(self, piece):
+        board = self.board
+        turns = []
+        for first in board.capture_moves(piece):
+            undo = board.make_move(*first)
+            seconds = []
+            if board.triangle and board.circle:
+                seconds = [move for move in board.capture_moves(piece) if move[0] != first[1]]
+            board.unmake_move(undo)
+            if seconds:
+                turns.extend((first, second) for second in seconds)
+            else:
+                turns.append((first,))
+        return turns
+
+    # a last-ply node with every leaf scored in one batch, the scan over the scores then
+    # stops where the one by one loop would, so the value, best turn and node count are the same
+    # leaves the tablebase knows keep its score and are left out of the batch
+    def batch_leaf_node(self, piece, alpha, beta, best_turn, depth):
+        pieces = self.board.triangle + self.board.circle
+        turns, scores, t_boards, o_boards, keys, quiet = [], [], [], [], [], []
+        for turn in self.leaf_turns(piece, best_turn, depth):
+            turns.append(turn)
+            score = self.tablebase_score(self.root_depth, piece == 'O')
+            scores.append(score)
+            if score is None:
+                t_boards.append(self.board.t)
+                o_boards.append(self.board.o)
+                keys.append(self.board.hash)
+            quiet.append(self.board.triangle + self.board.circle == pieces)
+        if keys:
+            batch = iter(self.batch_scores(t_boards, o_boards, keys))
+            scores = [next(batch) if score is None else score for score in scores]
+
+        maximizing = piece == 'T'
+        best_score = float('-inf') if maximizing else float('inf')
+        best_turn = None
+        searched = 0
+        for turn, score, turn_quiet in zip(turns, scores, quiet):
+            searched += 1
+            if maximizing:
+                if score > best_score:
+                    best_score = score
+                    best_turn = turn
+                alpha = max(alpha, score)
+            else:
+                if score < best_score:
+                    best_score = score
+                    best_turn = turn
+                beta = min(beta, score)
+            if beta <= alpha:
+                if turn_quiet and self.ordering is not None:
+                    self.ordering.cutoff(piece, self.root_depth - depth, depth, turn)
+                break
+        self.nodes += searched
+        if self.stats is not None:
+            self.stats.leaf_evals += searched
+        return best_score, best_turn, alpha, beta, searched
+
+    # scores of the positions given as bitboards and zobrist keys, cache misses go to the batch evaluator
+    def batch_scores(self, t_boards, o_boards, keys):
+        if self.eval_cache is None:
+            return self.batch.evaluate_bitboards(t_boards, o_boards, self.game.return_total_moves()).tolist()
+        scores = [self.eval_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if self.stats is not None:
+            self.stats.eval_cache_hits += len(scores) - len(missing)
+        if missing:
+            fresh = self.batch.evaluate_bitboards([t_boards[i] for i in missing], [o_boards[i] for i in missing],
+                                                  self.game.return_total_moves()).tolist()
+            if len(self.eval_cache) + len(missing) > self.eval_cache_entries:
+                self.eval_cache.clear()
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+                self.eval_cache[keys[i]] = score
+        return scores
 
-        ai_capturable = self.calculate_capturable_pieces('T')
-        human_capturable = self.calculate_capturable_pieces('O')
-        capturing_potential = human_capturable - ai_capturable
+    # the same leaf is reached through many move orders, so scores are cached by zobrist hash
+    def evaluate_board(self):
+        if self.stats is not None:
+            self.stats.leaf_evals += 1
+        if self.eval_cache is None:
+            score = self.score_board()
+        else:
+            score = self.eval_cache.get(self.board.hash)
+            if score is not None and self.stats is not None:
+                self.stats.eval_cache_hits += 1
+            if score is None:
+                score = self.score_board()
+                if len(self.eval_cache) >= self.eval_cache_entries:
+                    self.eval_cache.clear()
+                self.eval_cache[self.board.hash] = score
+        if self.verify and score != self.evaluate_from_scratch():
+            raise AssertionError(f"evaluation {score} differs from the full rescan {self.evaluate_from_scratch()}")
+        return score
+
+    def score_board(self):
+        piece_diff = self.board.triangle - self.board.circle
+        (ai_mobility, human_mobility, ai_pos_score, human_pos_score,
+         ai_capturable, human_capturable) = self.board.evaluation_terms(self.position_planes)
+        return self.combine_terms(piece_diff, ai_mobility - human_mobility, ai_pos_score - human_pos_score,
+                                  human_capturable - ai_capturable)
 
-        moves_remaining = 50 - self.game.return_total_moves()
-        endgame_bonus = moves_remaining * 0.1 if moves_remaining > 0 else 0
+    # part of every score that only depends on how many moves are left
+    def endgame_bonus(self):
+        moves_remaining = MAX_TURNS - self.game.return_total_moves()
+        return moves_remaining * self.weights['endgame'] if moves_remaining > 0 else 0
 
+    def combine_terms(self, piece_diff, mobility_score, positional_advantage, capturing_potential):
+        weights = self.weights
         return (
-            piece_diff * 1.0 +
-            mobility_score * 0.5 +
-            positional_advantage * 0.7 +
-            capturing_potential * 1.5 +
-            endgame_bonus
+            piece_diff * weights['piece'] +
+            mobility_score * weights['mobility'] +
+            positional_advantage * weights['position'] +
+            capturing_potential * weights['capture'] +
+            self.endgame_bonus()
         )
 
+    # the original cell by cell scorer over the grid view, used by verify
+    def evaluate_from_scratch(self):
+        grid = self.board.grid
+        size = len(grid)
+        cell_weights = self.position_weights
+        totals = {}
+        for piece in ('T', 'O'):
+            opponent = 'T' if piece == 'O' else 'O'
+            mobility = position = capturable = 0
+            for x in range(size):
+                for y in range(size):
+                    if grid[x][y] != piece:
+                        continue
+                    position += cell_weights[x * size + y]
+                    for dx, dy in DIRECTIONS.values():
+                        nx, ny = x + dx, y + dy
+                        if not (0 <= nx < size and 0 <= ny < size):
+                            continue
+                        if grid[nx][ny] == '.':
+                            mobility += 1
+                        elif grid[nx][ny] == opponent:
+                            fx, fy = nx + dx, ny + dy
+                            if 0 <= fx < size and 0 <= fy < size and grid[fx][fy] == piece:
+                                capturable += 1
+            totals[piece] = (mobility, position, capturable)
+        (ai_mobility, ai_pos_score, ai_capturable) = totals['T']
+        (human_mobility, human_pos_score, human_capturable) = totals['O']
+        return self.combine_terms(self.board.triangle - self.board.circle, ai_mobility - human_mobility,
+                                  ai_pos_score - human_pos_score, human_capturable - ai_capturable)
+
     def is_terminal(self):
         return self.board.triangle == 0 or self.board.circle == 0 or (self.board.triangle + self.board.circle == 0)
 
     def calculate_mobility(self, piece):
-        mobility = 0
-        for x in range(self.board.size):
-            for y in range(self.board.size):
-                if self.board.grid[x][y] == piece:
-                    for dx, dy in DIRECTIONS.values():
-                        if self.board.is_valid_move(x, y, x + dx, y + dy):
-                            mobility += 1
-        return mobility
+        return self.board.mobility(piece)
 
     def calculate_positional_advantage(self, piece):
-        position_weights = [
-            [1, 2, 3, 3, 3, 2, 1],
-            [2, 3, 4, 4, 4, 3, 2],
-            [3, 4, 5, 5, 5, 4, 3],
-            [3, 4, 5, 6, 5, 4, 3],
-            [3, 4, 5, 5, 5, 4, 3],
-            [2, 3, 4, 4, 4, 3, 2],
-            [1, 2, 3, 3, 3, 2, 1],
-        ]
-        score = 0
-        for x in range(self.board.size):
-            for y in range(self.board.size):
-                if self.board.grid[x][y] == piece:
-                    score += position_weights[x][y]
-        return score
+        return self.board.positional(piece, self.position_planes)
 
     def calculate_capturable_pieces(self, piece):
-        opponent = 'T' if piece == 'O' else 'O'
-        capturable = 0
-        for x in range(self.board.size):
-            for y in range(self.board.size):
-                if self.board.grid[x][y] == piece:
-                    for dx, dy in DIRECTIONS.values():
-                        nx, ny = x + dx, y + dy
-                        if self.board.is_valid_position(nx, ny) and self.board.grid[nx][ny] == opponent:
-                            fx, fy = nx + dx, ny + dy
-                            if self.board.is_valid_position(fx, fy) and self.board.grid[fx][fy] == piece:
-                                capturable += 1
-        return capturable
\ No newline at end of file
+        return self.board.capturable(piece)
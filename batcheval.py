@@ -0,0 +1,101 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# numpy batch version of AI.score_board, scores many positions with a few array passes
+# boards come in as an (N, 7, 7) int8 array (1 ai piece T, -1 human piece O, 0 empty) or as two lists of
+# bitboards, internally every board is a pair of uint64 bitboards and the terms are shifts and popcounts
+# over the whole batch, the same ones BitBoard.evaluation_terms does for one board
+# scores are the same floats the scalar scorer gives, the terms are combined in the same order
+# numpy is optional, only AI(batch_eval=True) and this module need it
+from bitboard import CELLS, FULL, NOT_FIRST, NOT_LAST, SIZE, weight_planes
+from constants import MAX_TURNS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    _FULL = np.uint64(FULL)
+    _NOT_FIRST = np.uint64(NOT_FIRST)
+    _NOT_LAST = np.uint64(NOT_LAST)
+    _ONE = np.uint64(1)
+    _ROW = np.uint64(SIZE)
+    _POP8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def _popcount(bbs):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bbs).astype(np.int64)
+    return _POP8[bbs.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+# every bitboard shifted one cell up, down, left and right, bits that leave the board are dropped
+def _neighbours(bbs):
+    return (
+        bbs >> _ROW,
+        (bbs << _ROW) & _FULL,
+        (bbs & _NOT_FIRST) >> _ONE,
+        (bbs & _NOT_LAST) << _ONE,
+    )
+
+
+class BatchEvaluator:
+    def __init__(self, position_weights, weights):
+        # position_weights is the flat per-cell table, weights the AI evaluation weights
+        if np is None:
+            raise ImportError("batch evaluation needs numpy")
+        self.planes = [np.uint64(plane) for plane in weight_planes(position_weights)]
+        self.weights = weights
+
+    # int8 board array of bitboard lists
+    def stack(self, ts, os):
+        return (self.unpack(ts) - self.unpack(os)).astype(np.int8)
+
+    @staticmethod
+    def unpack(bbs):
+        planes = np.array(bbs, dtype=np.uint64).view(np.uint8).reshape(-1, 8)
+        return np.unpackbits(planes, axis=1, bitorder='little')[:, :CELLS].reshape(-1, SIZE, SIZE).astype(np.int8)
+
+    # uint64 bitboards of the cells equal to value in an int8 board array
+    @staticmethod
+    def pack(boards, value):
+        cells = (boards.reshape(-1, CELLS) == value).astype(np.uint8)
+        cells = np.pad(cells, ((0, 0), (0, 64 - CELLS)))
+        return np.packbits(cells, axis=1, bitorder='little').view(np.uint64).ravel()
+
+    # per board (mobility, position, capturable) of the side on own
+    def side_terms(self, own, opp, empty):
+        up, down, left, right = _neighbours(own)
+        # a piece can move into an empty neighbour
+        mobility = _popcount(up & empty) + _popcount(down & empty) + _popcount(left & empty) + _popcount(right & empty)
+        # an opponent piece with own pieces on both sides, counted from each of the two, like the scalar scorer
+        capturable = 2 * (_popcount(up & down & opp) + _popcount(left & right & opp))
+        position = 0
+        for k, plane in enumerate(self.planes):
+            position = position + (_popcount(own & plane) << k)
+        return mobility, position, capturable
+
+    # scores of an (N, 7, 7) board array after total_moves turns (an int or one per board)
+    def evaluate(self, boards, total_moves):
+        return self.evaluate_packed(self.pack(boards, 1), self.pack(boards, -1), total_moves)
+
+    # scores straight from lists of ai and human bitboards
+    def evaluate_bitboards(self, ts, os, total_moves):
+        return self.evaluate_packed(np.array(ts, dtype=np.uint64), np.array(os, dtype=np.uint64), total_moves)
+
+    def evaluate_packed(self, t, o, total_moves):
+        empty = _FULL & ~(t | o)
+        t_mob, t_pos, t_cap = self.side_terms(t, o, empty)
+        o_mob, o_pos, o_cap = self.side_terms(o, t, empty)
+        piece_diff = _popcount(t) - _popcount(o)
+
+        moves_remaining = MAX_TURNS - np.asarray(total_moves, dtype=np.int64)
+        endgame_bonus = np.where(moves_remaining > 0, moves_remaining * self.weights['endgame'], 0)
+        weights = self.weights
+        return (
+            piece_diff * weights['piece'] +
+            (t_mob - o_mob) * weights['mobility'] +
+            (t_pos - o_pos) * weights['position'] +
+            (o_cap - t_cap) * weights['capture'] +
+            endgame_bonus
+        )
@@ -0,0 +1,263 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# search and evaluation benchmarks over the fixed positions in positions.txt
+# results are written as json so two runs can be compared, --baseline flags the metrics that got worse
+# --compare OPTION searches every position with an AI option off and on instead, the best turns must agree
+# usage: python benchmark.py --depth 3 --out bench.json [--baseline old.json] [--tolerance 0.1]
+#        python benchmark.py --depth 4 --compare pvs
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import batcheval
+from ai import AI, POSITION_WEIGHTS
+from bitboard import BitBoard
+from board import Board
+from layout import Layout
+from parallel import SearchGame
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'positions.txt')
+
+# summary metrics and whether a bigger value is better
+METRICS = {
+    'nodes_per_s': True,
+    'evals_per_s': True,
+    'batch_evals_per_s': True,
+    'board_check_captures_per_s': True,
+    'bitboard_check_captures_per_s': True,
+    'time_to_depth_ms': False,
+    'search_nodes': False,
+}
+
+
+# grid Board from the '/' separated rows of a corpus line, the board size is the number of rows
+def board_from_rows(rows):
+    grid = [list(row) for row in rows.split('/')]
+    if len(grid) < 3 or any(len(row) != len(grid) for row in grid):
+        raise ValueError(f"Invalid position rows: {rows}")
+    board = Board(Layout(len(grid), (), ()))
+    board.grid = grid
+    board.triangle = sum(row.count('T') for row in board.grid)
+    board.circle = sum(row.count('O') for row in board.grid)
+    return board
+
+
+# the inverse, to write new positions into the corpus
+def rows_of(board):
+    return '/'.join(''.join(row) for row in board.grid)
+
+
+def load_corpus(path=CORPUS):
+    positions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, phase, total_moves, rows = line.split()
+            positions.append({
+                'name': name,
+                'phase': phase,
+                'total_moves': int(total_moves),
+                'piece': 'T' if int(total_moves) % 2 == 0 else 'O',
+                'board': board_from_rows(rows),
+            })
+    return positions
+
+
+# iterative deepening to depth with no time limit, the iterations give the time to every depth
+# options are passed on to the AI
+def bench_search(position, depth, **options):
+    board = BitBoard.from_board(position['board'])
+    ai = AI(board, SearchGame(position['total_moves']), piece=position['piece'],
+            time_budget_ms=float('inf'), max_depth=depth, stats=True, **options)
+    best_turn = ai.play_turn()
+    stats = ai.stats
+    time_to_depth = []
+    elapsed = 0.0
+    for iteration in stats.iterations:
+        elapsed += iteration['time_ms']
+        time_to_depth.append(elapsed)
+    return {
+        'name': position['name'],
+        'phase': position['phase'],
+        'depth': ai.completed_depth,
+        'nodes': stats.nodes,
+        'leaf_evals': stats.leaf_evals,
+        'time_ms': stats.time_ms,
+        'nodes_per_s': stats.nodes / stats.time_ms * 1000 if stats.time_ms else 0.0,
+        'time_to_depth_ms': time_to_depth,
+        'first_move_cutoff_rate': stats.first_move_cutoff_rate(),
+        'best_turn': [[divmod(src, board.size), divmod(dst, board.size)] for src, dst in best_turn or ()],
+    }
+
+
+# scorer calls per second, the eval cache is bypassed
+def bench_eval(positions, repeat):
+    ais = [AI(BitBoard.from_board(p['board']), SearchGame(p['total_moves'])) for p in positions]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for ai in ais:
+            ai.score_board()
+    elapsed = time.perf_counter() - started
+    return repeat * len(ais) / elapsed
+
+
+# numpy batch scorer over the whole corpus repeated into one batch, None without numpy
+def bench_batch_eval(positions, repeat):
+    if batcheval.np is None:
+        return None
+    ai = AI(BitBoard(), SearchGame())
+    evaluator = batcheval.BatchEvaluator(POSITION_WEIGHTS, ai.weights)
+    boards = [BitBoard.from_board(p['board']) for p in positions] * repeat
+    total_moves = [p['total_moves'] for p in positions] * repeat
+    started = time.perf_counter()
+    evaluator.evaluate_bitboards([b.t for b in boards], [b.o for b in boards], total_moves)
+    elapsed = time.perf_counter() - started
+    return len(boards) / elapsed
+
+
+# full check_captures scans per second, corpus positions have nothing to capture so the board never changes
+def bench_check_captures(boards, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for board in boards:
+            board.check_captures()
+    elapsed = time.perf_counter() - started
+    return repeat * len(boards) / elapsed
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(CORPUS)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(depth=3, repeat=200, corpus=CORPUS):
+    positions = load_corpus(corpus)
+    searches = [bench_search(position, depth) for position in positions]
+    nodes = sum(result['nodes'] for result in searches)
+    search_ms = sum(result['time_ms'] for result in searches)
+    phases = {}
+    for result in searches:
+        phase = phases.setdefault(result['phase'], {'positions': 0, 'nodes': 0, 'time_ms': 0.0})
+        phase['positions'] += 1
+        phase['nodes'] += result['nodes']
+        phase['time_ms'] += result['time_ms']
+    for phase in phases.values():
+        phase['nodes_per_s'] = phase['nodes'] / phase['time_ms'] * 1000 if phase['time_ms'] else 0.0
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'depth': depth,
+            'repeat': repeat,
+            'corpus': os.path.basename(corpus),
+            'positions': len(positions),
+        },
+        'summary': {
+            'search_nodes': nodes,
+            'time_to_depth_ms': search_ms,
+            'nodes_per_s': nodes / search_ms * 1000 if search_ms else 0.0,
+            'evals_per_s': bench_eval(positions, repeat),
+            'batch_evals_per_s': bench_batch_eval(positions, repeat),
+            'board_check_captures_per_s': bench_check_captures([p['board'] for p in positions], repeat // 4 or 1),
+            'bitboard_check_captures_per_s': bench_check_captures(
+                [BitBoard.from_board(p['board']) for p in positions], repeat),
+        },
+        'phases': phases,
+        'positions': searches,
+    }
+
+
+# nodes and time of every position searched with a boolean AI option off and on, with whether
+# both searches chose the same turn
+def compare(option, depth=3, corpus=CORPUS):
+    rows = []
+    for position in load_corpus(corpus):
+        off = bench_search(position, depth, **{option: False})
+        on = bench_search(position, depth, **{option: True})
+        rows.append({
+            'name': position['name'],
+            'off_nodes': off['nodes'],
+            'on_nodes': on['nodes'],
+            'off_ms': off['time_ms'],
+            'on_ms': on['time_ms'],
+            'same_turn': off['best_turn'] == on['best_turn'],
+        })
+    return rows
+
+
+# metrics that moved the wrong way by more than tolerance, as (metric, baseline, current, change)
+def regressions(results, baseline, tolerance=0.1):
+    found = []
+    for metric, higher_is_better in METRICS.items():
+        old = baseline['summary'].get(metric)
+        new = results['summary'].get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            found.append((metric, old, new, change))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search and evaluation benchmarks")
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=200, help='passes over the corpus for the throughput tests')
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--out', default='-', help='json file to write, - for stdout')
+    parser.add_argument('--baseline', default=None, help='earlier --out file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slowdown')
+    parser.add_argument('--compare', default=None, help='AI option to search with off and on, e.g. pvs')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        rows = compare(args.compare, args.depth, args.corpus)
+        for row in rows:
+            print(f"{row['name']:24} {row['off_nodes']:8} -> {row['on_nodes']:8} nodes  "
+                  f"{row['off_ms']:8.1f} -> {row['on_ms']:8.1f} ms  {'same' if row['same_turn'] else 'DIFFERENT'}")
+        off = sum(row['off_nodes'] for row in rows)
+        on = sum(row['on_nodes'] for row in rows)
+        off_ms = sum(row['off_ms'] for row in rows)
+        on_ms = sum(row['on_ms'] for row in rows)
+        print(f"{args.compare}: {off} -> {on} nodes ({on / off:.1%}), {off_ms / 1000:.2f}s -> {on_ms / 1000:.2f}s")
+        return 0 if all(row['same_turn'] for row in rows) else 1
+
+    results = run(args.depth, args.repeat, args.corpus)
+    if args.out == '-':
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    summary = results['summary']
+    print(f"depth {args.depth}: {summary['search_nodes']} nodes in {summary['time_to_depth_ms'] / 1000:.2f}s "
+          f"({summary['nodes_per_s']:.0f} nodes/s), {summary['evals_per_s']:.0f} evals/s, check_captures "
+          f"{summary['board_check_captures_per_s']:.0f}/s grid, {summary['bitboard_check_captures_per_s']:.0f}/s bitboard",
+          file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('depth') != args.depth:
+            print(f"baseline was run at depth {baseline['meta'].get('depth')}, not {args.depth}", file=sys.stderr)
+        found = regressions(results, baseline, args.tolerance)
+        for metric, old, new, change in found:
+            print(f"REGRESSION {metric}: {old:.1f} -> {new:.1f} ({change:+.1%})", file=sys.stderr)
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,497 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# bitboard version of the board, one integer per side with a bit per cell
+# cell (x, y) is bit x * size + y, so walking the bits low to high is row-major order
+# every table that depends on the board size lives in a Geometry, built once per size
+import random
+
+from constants import DIRECTIONS
+from layout import STANDARD
+
+OPPOSITE = {"up": "down", "down": "up", "left": "right", "right": "left"}
+ZOBRIST_SEED = 20210702027
+
+
+# split a table of non-negative integer cell weights into bit planes,
+# so a weighted sum over pieces becomes a few popcounts
+def weight_planes(weights):
+    planes = []
+    k = 0
+    while any(w >> k for w in weights):
+        planes.append(sum(1 << i for i, w in enumerate(weights) if (w >> k) & 1))
+        k += 1
+    return planes
+
+
+# positional weights, higher towards the centre: 1 in the corners, one more per row and column
+# away from the edge up to a plateau, and one more on the centre cell
+def position_weights(size):
+    cap = (size - 3) // 2
+    centre = size // 2 if size % 2 else None
+    weights = []
+    for x in range(size):
+        for y in range(size):
+            dx, dy = min(x, size - 1 - x), min(y, size - 1 - y)
+            weights.append(1 + min(dx, cap) + min(dy, cap) + (x == y == centre))
+    return weights
+
+
+class Geometry:
+    def __init__(self, size):
+        self.size = size
+        self.cells = size * size
+        self.full = (1 << self.cells) - 1
+        self.bit = [1 << i for i in range(self.cells)]
+
+        # per direction: index step and the cells that can take that step without leaving the board
+        self.steps = {}
+        self.edge_masks = {}
+        for name, (dx, dy) in DIRECTIONS.items():
+            self.steps[name] = dx * size + dy
+            self.edge_masks[name] = sum(self.bit[x * size + y] for x in range(size) for y in range(size)
+                                        if 0 <= x + dx < size and 0 <= y + dy < size)
+
+        # column masks for the horizontal shifts, vertical shifts fall off the ends by themselves
+        self.columns = [sum(self.bit[x * size + y] for x in range(size)) for y in range(size)]
+        self.not_first = self.full & ~self.columns[0]
+        self.not_first2 = self.not_first & ~self.columns[1]
+        self.not_last = self.full & ~self.columns[size - 1]
+        self.not_last2 = self.not_last & ~self.columns[size - 2]
+
+        # rays from every cell towards the edge, in DIRECTIONS order (up, down, left, right)
+        self.rays = []
+        for i in range(self.cells):
+            rays = []
+            for dx, dy in DIRECTIONS.values():
+                ray = []
+                x, y = divmod(i, size)
+                x, y = x + dx, y + dy
+                while 0 <= x < size and 0 <= y < size:
+                    ray.append(x * size + y)
+                    x, y = x + dx, y + dy
+                rays.append(ray)
+            self.rays.append(rays)
+        # the cells next to every cell, the first cell of each ray
+        self.neighbours = [[ray[0] for ray in rays if ray] for rays in self.rays]
+
+        # zobrist keys per cell for each side, plus one for "ai to move" used by search tables
+        # the standard size keeps the keys of the original 7x7 board, books depend on them
+        rng = random.Random(ZOBRIST_SEED if size == STANDARD.size else ZOBRIST_SEED + size)
+        self.zobrist_t = [rng.getrandbits(64) for _ in range(self.cells)]
+        self.zobrist_o = [rng.getrandbits(64) for _ in range(self.cells)]
+        self.zobrist_side = rng.getrandbits(64)
+
+        self.position_weights = position_weights(size)
+        self.position_planes = weight_planes(self.position_weights)
+
+    # every set bit one cell in the given direction, dropping bits that fall off the board
+    def shift(self, bb, direction):
+        step = self.steps[direction]
+        bb &= self.edge_masks[direction]
+        return bb << step if step > 0 else bb >> -step
+
+
+GEOMETRIES = {}
+
+
+def geometry(size):
+    if size not in GEOMETRIES:
+        GEOMETRIES[size] = Geometry(size)
+    return GEOMETRIES[size]
+
+
+# the standard board, modules that only handle 7x7 (book, tablebase, records, batch evaluator)
+# use these directly
+_standard = geometry(STANDARD.size)
+SIZE = _standard.size
+CELLS = _standard.cells
+FULL = _standard.full
+BIT = _standard.bit
+NOT_FIRST = _standard.not_first
+NOT_LAST = _standard.not_last
+ZOBRIST_T = _standard.zobrist_t
+ZOBRIST_O = _standard.zobrist_o
+ZOBRIST_AI_TO_MOVE = _standard.zobrist_side
+
+
+def bits(bb):
+    # yield set bit indexes from low to high
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+class BitBoard:
+    def __init__(self, layout=STANDARD):
+        # setup initial game state, layout gives the board size and the starting cells
+        self.geo = geometry(layout.size)
+        self.size = layout.size  # board size
+        self.triangle = len(layout.t_cells)  # ai pieces
+        self.circle = len(layout.o_cells)    # human pieces
+        self.t = 0         # bitboard of ai pieces
+        self.o = 0         # bitboard of human pieces
+        self.hash = 0      # zobrist hash, kept up to date by every move
+        self.initialize_board(layout)
+
+    def initialize_board(self, layout=STANDARD):
+        # place starting pieces on board
+        bit = self.geo.bit
+        for x, y in layout.t_cells:
+            self.t |= bit[x * self.size + y]
+        for x, y in layout.o_cells:
+            self.o |= bit[x * self.size + y]
+        self.hash = self.compute_hash()
+
+    @classmethod
+    def from_board(cls, board):
+        # build a bitboard from anything exposing grid, size and the piece counters
+        new = cls.__new__(cls)
+        new.size = board.size
+        new.geo = geometry(board.size)
+        new.t = new.o = 0
+        for x in range(board.size):
+            for y in range(board.size):
+                if board.grid[x][y] == 'T':
+                    new.t |= new.geo.bit[x * board.size + y]
+                elif board.grid[x][y] == 'O':
+                    new.o |= new.geo.bit[x * board.size + y]
+        new.triangle = board.triangle
+        new.circle = board.circle
+        new.hash = new.compute_hash()
+        return new
+
+    # empty board of a size, for code that fills it with set_position
+    @classmethod
+    def empty(cls, size=SIZE):
+        new = cls.__new__(cls)
+        new.size = size
+        new.geo = geometry(size)
+        new.t = new.o = 0
+        new.triangle = new.circle = 0
+        new.hash = 0
+        return new
+
+    # put the pieces of two bitboards on the board, the piece counts and the hash follow them
+    def set_position(self, t, o):
+        self.t, self.o = t, o
+        self.triangle, self.circle = t.bit_count(), o.bit_count()
+        self.hash = self.compute_hash()
+
+    def copy(self):
+        new = self.__class__.__new__(self.__class__)
+        new.size = self.size
+        new.geo = self.geo
+        new.t, new.o = self.t, self.o
+        new.triangle, new.circle = self.triangle, self.circle
+        new.hash = self.hash
+        return new
+
+    # hash from scratch, make_move and unmake_move update it incrementally
+    def compute_hash(self):
+        zobrist_t, zobrist_o = self.geo.zobrist_t, self.geo.zobrist_o
+        h = 0
+        for i in bits(self.t):
+            h ^= zobrist_t[i]
+        for i in bits(self.o):
+            h ^= zobrist_o[i]
+        return h
+
+    # read-only grid view so the gui and game code can keep indexing grid[x][y]
+    @property
+    def grid(self):
+        return [[self.piece_at(x, y) for y in range(self.size)] for x in range(self.size)]
+
+    def piece_at(self, x, y):
+        bit = self.geo.bit[x * self.size + y]
+        if self.t & bit:
+            return 'T'
+        if self.o & bit:
+            return 'O'
+        return '.'
+
+    def is_valid_position(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    def is_valid_move(self, x, y, new_x, new_y):
+        if not (self.is_valid_position(x, y) and self.is_valid_position(new_x, new_y)):
+            return False
+        occupied = self.t | self.o
+        bit = self.geo.bit
+        if not occupied & bit[x * self.size + y] or occupied & bit[new_x * self.size + new_y]:
+            return False
+        return True
+
+    def move_piece_by_delta(self, x, y, dx, dy):
+        new_x, new_y = x + dx, y + dy
+        if not self.is_valid_move(x, y, new_x, new_y):
+            raise ValueError(f"Invalid move from ({x}, {y}) to ({new_x}, {new_y}).")
+        self.make_move(x * self.size + y, new_x * self.size + new_y)
+
+    def move_piece(self, x, y, direction):
+        if direction not in DIRECTIONS:
+            raise ValueError("Invalid direction")
+        dx, dy = DIRECTIONS[direction]
+        self.move_piece_by_delta(x, y, dx, dy)
+
+    def move_piece_by_coords(self, x, y, new_x, new_y):
+        if abs(x - new_x) + abs(y - new_y) != 1:
+            raise ValueError("Invalid move coordinates.")
+        if not self.is_valid_move(x, y, new_x, new_y):
+            raise ValueError("Invalid move by coordinates.")
+        self.make_move(x * self.size + y, new_x * self.size + new_y)
+
+    # move a piece between two cell indexes without validation and return an undo record
+    # only the lines through the destination can change, so captures are resolved there
+    def make_move(self, src, dst):
+        geo = self.geo
+        bit = geo.bit
+        moved = bit[src] | bit[dst]
+        if self.t & bit[src]:
+            self.t ^= moved
+            self.hash ^= geo.zobrist_t[src] ^ geo.zobrist_t[dst]
+            captured_o, captured_t = self.captures_at(dst, self.t, self.o)
+        else:
+            self.o ^= moved
+            self.hash ^= geo.zobrist_o[src] ^ geo.zobrist_o[dst]
+            captured_t, captured_o = self.captures_at(dst, self.o, self.t)
+        if captured_t or captured_o:
+            self.remove_captured(captured_t, captured_o)
+        return src, dst, captured_t, captured_o
+
+    def unmake_move(self, undo):
+        src, dst, captured_t, captured_o = undo
+        if captured_t or captured_o:
+            self.remove_captured(captured_t, captured_o, restore=True)
+        geo = self.geo
+        bit = geo.bit
+        moved = bit[src] | bit[dst]
+        if self.t & bit[dst]:
+            self.t ^= moved
+            self.hash ^= geo.zobrist_t[src] ^ geo.zobrist_t[dst]
+        else:
+            self.o ^= moved
+            self.hash ^= geo.zobrist_o[src] ^ geo.zobrist_o[dst]
+
+    # take captured pieces off the board, or put them back when restoring
+    def remove_captured(self, captured_t, captured_o, restore=False):
+        zobrist_t, zobrist_o = self.geo.zobrist_t, self.geo.zobrist_o
+        for i in bits(captured_t):
+            self.hash ^= zobrist_t[i]
+        for i in bits(captured_o):
+            self.hash ^= zobrist_o[i]
+        if restore:
+            self.t |= captured_t
+            self.o |= captured_o
+            self.triangle += captured_t.bit_count()
+            self.circle += captured_o.bit_count()
+        else:
+            self.t &= ~captured_t
+            self.o &= ~captured_o
+            self.triangle -= captured_t.bit_count()
+            self.circle -= captured_o.bit_count()
+
+    def capture_piece(self, x, y):
+        bit = self.geo.bit[x * self.size + y]
+        if self.t & bit:
+            self.remove_captured(bit, 0)
+        elif self.o & bit:
+            self.remove_captured(0, bit)
+
+    # opponent runs starting next to cell i that are closed by own piece or the wall
+    def anchored_captures(self, i, own, opp):
+        captured = 0
+        cell_bit = self.geo.bit
+        for ray in self.geo.rays[i]:
+            run = 0
+            for j in ray:
+                bit = cell_bit[j]
+                if opp & bit:
+                    run |= bit
+                else:
+                    if own & bit:
+                        captured |= run
+                    break
+            else:
+                captured |= run
+        return captured
+
+    # captures caused by a piece arriving on cell i, returns (opponent captured, own captured)
+    def captures_at(self, i, own, opp):
+        captured_opp = self.anchored_captures(i, own, opp)
+        captured_own = 0
+        cell_bit = self.geo.bit
+        up, down, left, right = self.geo.rays[i]
+        for first, second in ((up, down), (left, right)):
+            # own run through i along this line, an end is 0 empty, 1 wall, 2 opponent
+            run = cell_bit[i]
+            first_end = second_end = 1
+            for j in first:
+                bit = cell_bit[j]
+                if not own & bit:
+                    first_end = 2 if opp & bit else 0
+                    break
+                run |= bit
+            if not first_end:
+                continue
+            for j in second:
+                bit = cell_bit[j]
+                if not own & bit:
+                    second_end = 2 if opp & bit else 0
+                    break
+                run |= bit
+            if second_end and (first_end == 2 or second_end == 2):
+                captured_own |= run
+        return captured_opp, captured_own
+
+    # full board capture check, moves only need captures_at
+    def check_captures(self):
+        captured_t = 0
+        captured_o = 0
+        for i in bits(self.t):
+            captured_o |= self.anchored_captures(i, self.t, self.o)
+        for i in bits(self.o):
+            captured_t |= self.anchored_captures(i, self.o, self.t)
+        if captured_t or captured_o:
+            self.remove_captured(captured_t, captured_o)
+
+    def pieces(self, piece):
+        return self.t if piece == 'T' else self.o
+
+    # (src, dst) index pairs in row-major piece order, then DIRECTIONS order
+    def legal_moves(self, piece):
+        geo = self.geo
+        own = self.pieces(piece)
+        empty = geo.full & ~(self.t | self.o)
+        movable = [(geo.shift(empty, OPPOSITE[name]) & own, geo.steps[name]) for name in DIRECTIONS]
+        moves = []
+        for i in bits(own):
+            bit = geo.bit[i]
+            for mask, step in movable:
+                if mask & bit:
+                    moves.append((i, i + step))
+        return moves
+
+    # legal moves that capture at least one opponent piece, only empty cells next to an opponent
+    # are tried as destinations
+    def capture_moves(self, piece):
+        geo = self.geo
+        if piece == 'T':
+            own, opp = self.t, self.o
+        else:
+            own, opp = self.o, self.t
+        targets = 0
+        for name in DIRECTIONS:
+            targets |= geo.shift(opp, name)
+        targets &= geo.full & ~(own | opp)
+        moves = []
+        if not targets:
+            return moves
+        for name in DIRECTIONS:
+            step = geo.steps[name]
+            for src in bits(geo.shift(targets, OPPOSITE[name]) & own):
+                dst = src + step
+                if self.anchored_captures(dst, own ^ geo.bit[src] ^ geo.bit[dst], opp):
+                    moves.append((src, dst))
+        return moves
+
+    # complete turns for one side: two moves by different pieces, captures resolved after each
+    # a turn is one move when no other piece can move or the first move ends the game,
+    # and empty when the side cannot move at all
+    # each turn is yielded while it is still played on the board, orderings that reach
+    # a position already yielded are skipped
+    def iter_turns(self, piece):
+        first_moves = self.legal_moves(piece)
+        if not first_moves:
+            yield ()
+            return
+        seen = set()
+        cells = self.geo.cells
+        for first in first_moves:
+            undo = self.make_move(*first)
+            try:
+                second_moves = []
+                if self.triangle and self.circle:
+                    second_moves = [move for move in self.legal_moves(piece) if move[0] != first[1]]
+                if not second_moves:
+                    position = self.t << cells | self.o
+                    if position not in seen:
+                        seen.add(position)
+                        yield (first,)
+                for second in second_moves:
+                    undo_second = self.make_move(*second)
+                    try:
+                        position = self.t << cells | self.o
+                        if position not in seen:
+                            seen.add(position)
+                            yield (first, second)
+                    finally:
+                        self.unmake_move(undo_second)
+            finally:
+                self.unmake_move(undo)
+
+    def legal_turns(self, piece):
+        return list(self.iter_turns(piece))
+
+    def make_turn(self, turn):
+        return [self.make_move(src, dst) for src, dst in turn]
+
+    def unmake_turn(self, undos):
+        for undo in reversed(undos):
+            self.unmake_move(undo)
+
+    def mobility(self, piece):
+        geo = self.geo
+        own = self.pieces(piece)
+        empty = geo.full & ~(self.t | self.o)
+        size, not_first, not_last = self.size, geo.not_first, geo.not_last
+        return (((own >> size) & empty).bit_count() + ((own << size) & empty).bit_count() +
+                (((own & not_first) >> 1) & empty).bit_count() + (((own & not_last) << 1) & empty).bit_count())
+
+    # weighted piece sum, planes come from weight_planes()
+    def positional(self, piece, planes):
+        own = self.pieces(piece)
+        score = 0
+        for k, plane in enumerate(planes):
+            score += (own & plane).bit_count() << k
+        return score
+
+    # pieces that sit next to an opponent with a friendly piece right behind it
+    def capturable(self, piece):
+        if piece == 'T':
+            own, opp = self.t, self.o
+        else:
+            own, opp = self.o, self.t
+        geo = self.geo
+        size = self.size
+        return ((own & (opp << size) & (own << 2 * size)).bit_count() +
+                (own & (opp >> size) & (own >> 2 * size)).bit_count() +
+                (own & ((opp & geo.not_last) << 1) & ((own & geo.not_last2) << 2)).bit_count() +
+                (own & ((opp & geo.not_first) >> 1) & ((own & geo.not_first2) >> 2)).bit_count())
+
+    # all per-side evaluation terms in one pass:
+    # (t mobility, o mobility, t positional, o positional, t capturable, o capturable)
+    def evaluation_terms(self, planes):
+        t, o = self.t, self.o
+        geo = self.geo
+        size = self.size
+        not_first, not_first2, not_last, not_last2 = geo.not_first, geo.not_first2, geo.not_last, geo.not_last2
+        empty = geo.full & ~(t | o)
+        t_pos = o_pos = 0
+        for k, plane in enumerate(planes):
+            t_pos += (t & plane).bit_count() << k
+            o_pos += (o & plane).bit_count() << k
+        return (
+            ((t >> size) & empty).bit_count() + ((t << size) & empty).bit_count() +
+            (((t & not_first) >> 1) & empty).bit_count() + (((t & not_last) << 1) & empty).bit_count(),
+            ((o >> size) & empty).bit_count() + ((o << size) & empty).bit_count() +
+            (((o & not_first) >> 1) & empty).bit_count() + (((o & not_last) << 1) & empty).bit_count(),
+            t_pos,
+            o_pos,
+            (t & (o << size) & (t << 2 * size)).bit_count() + (t & (o >> size) & (t >> 2 * size)).bit_count() +
+            (t & ((o & not_last) << 1) & ((t & not_last2) << 2)).bit_count() +
+            (t & ((o & not_first) >> 1) & ((t & not_first2) >> 2)).bit_count(),
+            (o & (t << size) & (o << 2 * size)).bit_count() + (o & (t >> size) & (o >> 2 * size)).bit_count() +
+            (o & ((t & not_last) << 1) & ((o & not_last2) << 2)).bit_count() +
+            (o & ((t & not_first) >> 1) & ((o & not_first2) >> 2)).bit_count(),
+        )
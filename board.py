@@ -1,30 +1,29 @@
 #Kagan Tek - 20210702027 - Strategic Board Game With AI
 
 # handles the game board, pieces and moves
+from bitboard import geometry
 from constants import DIRECTIONS
+from layout import STANDARD
 
 class Board:
-    def __init__(self):
-        # setup initial game state
-        self.triangle = 4  # ai pieces
-        self.circle = 4    # human pieces
-        self.size = 7      # board size
+    def __init__(self, layout=STANDARD):
+        # setup initial game state, layout gives the board size and the starting cells
+        self.triangle = len(layout.t_cells)  # ai pieces
+        self.circle = len(layout.o_cells)    # human pieces
+        self.size = layout.size              # board size
+        self.rays = geometry(layout.size).rays  # cells from every cell to the edge, per direction
         self.grid = [['.' for _ in range(self.size)] for _ in range(self.size)]
-        self.initialize_board()
+        self.initialize_board(layout)
 
-    def initialize_board(self):
+    def initialize_board(self, layout=STANDARD):
         # place starting pieces on board
         # ai pieces (T)
-        self.grid[0][0] = 'T'
-        self.grid[2][0] = 'T'
-        self.grid[4][6] = 'T'
-        self.grid[6][6] = 'T'
+        for x, y in layout.t_cells:
+            self.grid[x][y] = 'T'
 
         # human pieces (O)
-        self.grid[4][0] = 'O'
-        self.grid[6][0] = 'O'
-        self.grid[0][6] = 'O'
-        self.grid[2][6] = 'O'
+        for x, y in layout.o_cells:
+            self.grid[x][y] = 'O'
 
     def is_valid_position(self, x, y):
         return 0 <= x < self.size and 0 <= y < self.size
@@ -60,6 +59,28 @@ class Board:
         self.grid[x][y] = '.'
         self.check_captures()
 
+    # move a piece between two cell indexes (x * size + y) without validation
+    # and return an undo record of the move and the captured squares
+    def make_move(self, src, dst):
+        x, y = divmod(src, self.size)
+        new_x, new_y = divmod(dst, self.size)
+        self.grid[new_x][new_y] = self.grid[x][y]
+        self.grid[x][y] = '.'
+        return src, dst, self.check_captures()
+
+    def unmake_move(self, undo):
+        src, dst, captured = undo
+        for cx, cy, piece in captured:
+            self.grid[cx][cy] = piece
+            if piece == 'T':
+                self.triangle += 1
+            else:
+                self.circle += 1
+        x, y = divmod(src, self.size)
+        new_x, new_y = divmod(dst, self.size)
+        self.grid[x][y] = self.grid[new_x][new_y]
+        self.grid[new_x][new_y] = '.'
+
     def capture_piece(self, x, y):
         if self.grid[x][y] == 'T':
             self.triangle -= 1
@@ -68,22 +89,30 @@ class Board:
         self.grid[x][y] = '.'
 
     def check_captures(self):
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        # walks the precomputed rays, a run of opponents is captured when it ends on own piece or the wall
+        size = self.size
         to_capture = []
-        for x in range(self.size):
-            for y in range(self.size):
+        for x in range(size):
+            for y in range(size):
                 piece = self.grid[x][y]
                 if piece in ['T', 'O']:
                     opponent = 'T' if piece == 'O' else 'O'
-                    for dx, dy in directions:
+                    for ray in self.rays[x * size + y]:
                         captured_pieces = []
-                        nx, ny = x + dx, y + dy
-                        while self.is_valid_position(nx, ny) and self.grid[nx][ny] == opponent:
+                        for cell in ray:
+                            nx, ny = divmod(cell, size)
+                            if self.grid[nx][ny] != opponent:
+                                if self.grid[nx][ny] == piece:
+                                    to_capture.extend(captured_pieces)
+                                break
                             captured_pieces.append((nx, ny))
-                            nx, ny = nx + dx, ny + dy
-
-                        if (self.is_valid_position(nx, ny) and self.grid[nx][ny] == piece) or not self.is_valid_position(nx, ny):
+                        else:
                             to_capture.extend(captured_pieces)
 
+        # returns the captured squares with the piece that stood there
+        captured = []
         for cx, cy in to_capture:
-            self.capture_piece(cx, cy)
\ No newline at end of file
+            if self.grid[cx][cy] != '.':
+                captured.append((cx, cy, self.grid[cx][cy]))
+            self.capture_piece(cx, cy)
+        return captured
\ No newline at end of file
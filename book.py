@@ -0,0 +1,152 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# opening book: best turns of the opening positions, found offline by a deep search
+# the file is a header and fixed size records sorted by key, key is the zobrist hash of the position
+# with the side to move mixed in like the transposition table does, lookups binary search the mmap
+# usage: python book.py --turns 2 --depth 5 --workers auto --out opening.book
+import argparse
+import mmap
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import ZOBRIST_AI_TO_MOVE, BitBoard
+from parallel import SearchGame, resolve_workers
+
+MAGIC = b'SBGBOOK1'
+HEADER = struct.Struct('<8sI')  # magic, record count
+RECORD = struct.Struct('<Q4BhH')  # key, src and dst of both moves (255 when missing), score * 100, depth
+NO_MOVE = 255
+DEFAULT_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening.book')
+
+
+def book_key(board, piece):
+    return board.hash ^ ZOBRIST_AI_TO_MOVE if piece == 'T' else board.hash
+
+
+def pack_record(key, turn, score, depth):
+    cells = [cell for move in turn for cell in move]
+    cells += [NO_MOVE] * (4 - len(cells))
+    return RECORD.pack(key, *cells, round(score * 100), depth)
+
+
+def unpack_turn(cells):
+    return tuple((cells[i], cells[i + 1]) for i in (0, 2) if cells[i] != NO_MOVE)
+
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_BOOK):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not an opening book")
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or size != HEADER.size + self.count * RECORD.size:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    # (turn, score, depth) stored for the position with piece to move, or None
+    def probe(self, board, piece):
+        key = book_key(board, piece)
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.record(mid)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.count:
+            return None
+        record = self.record(low)
+        if record[0] != key:
+            return None
+        return unpack_turn(record[1:5]), record[5] / 100, record[6]
+
+    # the book turn if it is legal here (guards against hash collisions), else None
+    def lookup(self, board, piece):
+        entry = self.probe(board, piece)
+        if entry is None or entry[0] not in board.legal_turns(piece):
+            return None
+        return entry[0]
+
+    def close(self):
+        self.data.close()
+
+
+def write_book(path, entries):
+    # entries maps key -> (turn, score, depth)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key in sorted(entries):
+            f.write(pack_record(key, *entries[key]))
+
+
+def _search(task):
+    from ai import AI
+    t, o, total_moves, piece, depth = task
+    board = BitBoard()
+    board.set_position(t, o)
+    ai = AI(board, SearchGame(total_moves), depth=depth, piece=piece)
+    ai.prepare_tables()
+    turn, score = ai.search_root(depth)
+    return turn, score
+
+
+# search the opening tree: the ai side (T) only follows its book turn, every reply of the human side
+# is expanded, so the book answers whatever the human plays for the first `turns` ai turns
+# only positions with T to move are searched and stored, the ai never looks up the others
+def build_book(turns=2, depth=5, workers=1):
+    entries = {}
+    frontier = [BitBoard()]
+    executor = ProcessPoolExecutor(resolve_workers(workers)) if resolve_workers(workers) > 1 else None
+    try:
+        for total_moves in range(0, turns * 2, 2):
+            tasks = []
+            positions = []
+            for board in frontier:
+                key = book_key(board, 'T')
+                if key in entries:
+                    continue
+                entries[key] = None
+                positions.append((board, key))
+                tasks.append((board.t, board.o, total_moves, 'T', depth))
+            results = executor.map(_search, tasks) if executor else map(_search, tasks)
+            frontier = []
+            for (board, key), (turn, score) in zip(positions, results):
+                entries[key] = (turn, score, depth)
+                after = board.copy()
+                after.make_turn(turn)
+                for reply in after.legal_turns('O'):
+                    undos = after.make_turn(reply)
+                    frontier.append(after.copy())
+                    after.unmake_turn(undos)
+            print(f"{len(entries)} positions", file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the opening book")
+    parser.add_argument('--turns', type=int, default=2, help='ai turns the book covers')
+    parser.add_argument('--depth', type=int, default=5, help='search depth in whole turns')
+    parser.add_argument('--workers', default='auto', help='processes to use, or "auto"')
+    parser.add_argument('--out', default=DEFAULT_BOOK)
+    args = parser.parse_args(argv)
+    entries = build_book(args.turns, args.depth, args.workers)
+    write_book(args.out, entries)
+    print(f"wrote {len(entries)} positions to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,7 @@ DIRECTIONS = {
     "down": (1, 0),
     "left": (0, -1),
     "right": (0, 1)
-}
\ No newline at end of file
+}
+
+# games end when a side runs out of pieces or after this many turns
+MAX_TURNS = 50
@@ -1,20 +1,90 @@
 #Kagan Tek - 20210702027 - Strategic Board Game With AI
 
 # main game logic, handles turns and game flow
-from board import Board
+import os
+
+from bitboard import SIZE, BitBoard
+from book import DEFAULT_BOOK, OpeningBook
+from tablebase import DEFAULT_TABLEBASE, EndgameTable
+from records import GameWriter
 from human import Human
-from ai import AI
-from constants import DIRECTIONS
+from ai import AI, DEFAULT_WEIGHTS_FILE, load_weights
+from mcts import MCTS
+from thinking import BackgroundSearch
+from constants import DIRECTIONS, MAX_TURNS
+from layout import STANDARD
+
+
+# end of game message for a board after total_moves turns, or None while the game goes on
+def game_result(board, total_moves):
+    if board.triangle == 0 and board.circle > 0:
+        return "Human wins!"
+    elif board.circle == 0 and board.triangle > 0:
+        return "AI wins!"
+    elif board.circle == 0 and board.triangle == 0:
+        return "It's a draw!"
+    elif total_moves >= MAX_TURNS:
+        if board.triangle > board.circle:
+            return "AI wins!"
+        elif board.triangle < board.circle:
+            return "Human wins!"
+        else:
+            return "It's a draw!"
+    return None
+
+# the opening book, endgame tablebase and tuned weights next to the code, when they are there,
+# as (book, tablebase, weights) for a layout: the book only knows the standard layout and the
+# tablebase and the cell weights are 7x7 only
+# no weights file ships, tune.py writes one, the book was built with the built in weights
+# and should be rebuilt after tuning
+def engine_tables(layout):
+    book = tablebase = weights = None
+    if layout == STANDARD and os.path.exists(DEFAULT_BOOK):
+        book = OpeningBook(DEFAULT_BOOK)
+    if layout.size == SIZE and os.path.exists(DEFAULT_TABLEBASE):
+        tablebase = EndgameTable(DEFAULT_TABLEBASE)
+    if os.path.exists(DEFAULT_WEIGHTS_FILE):
+        weights = load_weights(DEFAULT_WEIGHTS_FILE)
+        if layout.size != SIZE:
+            weights.pop('cells', None)
+    return book, tablebase, weights
+
 
 class Game:
-    def __init__(self):
+    def __init__(self, stats=False, stats_file=None, ponder=False, record_file=None, layout=STANDARD,
+                 engine='alphabeta', time_budget_ms=None, workers=None):
         # setup game components
-        self.board = Board()
+        # stats shows the ai search counters in the gui, stats_file also appends them as json lines
+        # ponder lets the ai search the expected human reply while the human is on turn
+        # record_file appends the game, turn by turn, to a game record file
+        # layout is the board size and starting cells, the book, tablebase and records are 7x7 only
+        # engine is 'alphabeta' for the minimax AI or 'mcts' for monte carlo tree search, which has no stats
+        # time_budget_ms gives the ai that many ms per turn instead of a fixed depth or playout count
+        # workers searches with that many processes, "auto" uses every core
+        if engine not in ('alphabeta', 'mcts'):
+            raise ValueError(f"Unknown engine: {engine}")
+        if time_budget_ms is not None and time_budget_ms <= 0:
+            raise ValueError(f"The time budget must be positive, got {time_budget_ms} ms")
+        if record_file is not None and layout.size != SIZE:
+            raise ValueError(f"Game records only hold {SIZE}x{SIZE} games")
+        self.board = BitBoard(layout)
         self.turn = "AI"
         self.total_moves = 0
         self.human_player = Human(self.board, self)
-        self.ai_player = AI(self.board, self)
+        book, tablebase, weights = engine_tables(layout)
+        if engine == 'mcts':
+            self.ai_player = MCTS(self.board, self, time_budget_ms=time_budget_ms, workers=workers)
+        else:
+            self.ai_player = AI(self.board, self, stats=stats or stats_file is not None, book=book,
+                                tablebase=tablebase, weights=weights, time_budget_ms=time_budget_ms,
+                                workers=workers)
+        self.stats_file = stats_file
+        self.thinking = None  # background search while the ai is on turn
+        self.ponder = ponder
+        self.pondering = None  # background search while the human is on turn
         self.gui = None
+        self.recorder = GameWriter(record_file) if record_file is not None else None
+        self.human_moves = []  # moves of the human turn in progress, for the record
 
         self.human_pieces_to_move = []
         self.current_piece_index = 0
@@ -25,6 +95,8 @@ class Game:
         self.gui = gui
 
     def run(self):
+        if self.recorder is not None:
+            self.recorder.start(self.board, self.total_moves)
         self.gui.update_board_display()
         self.play_turn()
 
@@ -33,24 +105,92 @@ class Game:
             return
         if self.turn == "AI":
             self.gui.set_info("AI's turn... thinking.")
-            self.gui.root.after(500, self.ai_action)
+            self.ai_action()
         else:
             self.gui.set_info("Human's turn")
             self.human_player.play_turn()
 
+    # the search runs in a background thread, ai_done is called on the tk thread with its turn
     def ai_action(self):
-        self.ai_player.play_turn()
+        if self.use_ponder_search():
+            return
+        self.thinking = BackgroundSearch(self.ai_player, self.gui.root, self.ai_progress, self.ai_done)
+        self.thinking.start(self.board)
+        self.gui.enable_move_now()
+
+    def ai_progress(self, info):
+        best = " ".join(f"{src}->{dst}" for src, dst in info['best_turn'])
+        self.gui.set_info(f"AI's turn... thinking. depth {info['depth']}  best {best or '-'}  "
+                          f"{info['nodes_per_s']:.0f} nodes/s")
+
+    # while the human thinks, search the position after the reply the ai expects
+    def start_pondering(self):
+        reply = self.ai_player.expected_reply()
+        if reply is None:
+            return
+        position = self.board.copy()
+        position.make_turn(reply)
+        self.pondering = BackgroundSearch(self.ai_player, self.gui.root, lambda info: None, lambda turn: None)
+        self.pondering.start(self.board, position, self.total_moves + 1, ponder=True)
+
+    # on a ponder hit the ponder search carries on as the ai's search, or has already found the turn
+    # on a miss it is stopped, its table entries were searched at this move count and stay useful
+    def use_ponder_search(self):
+        pondering, self.pondering = self.pondering, None
+        if pondering is None:
+            return False
+        if pondering.matches(self.board) and not pondering.cancelled:
+            if pondering.running():
+                pondering.on_progress = self.ai_progress
+                pondering.on_done = self.ai_done
+                self.ai_player.ponder_hit()
+                self.thinking = pondering
+                self.gui.enable_move_now()
+                return True
+            if pondering.finished:
+                self.ai_done(pondering.result)
+                return True
+            # the thread is done but poll has not picked the turn up yet, it goes to ai_done then
+            pondering.on_done = self.ai_done
+            self.thinking = pondering
+            return True
+        pondering.cancel()
+        return False
+
+    # play now with the best turn found so far
+    def force_ai_move(self):
+        if self.thinking is not None:
+            self.thinking.force_move()
+
+    # drop the running searches, used when the game ends or the window closes
+    def cancel_ai(self):
+        if self.thinking is not None:
+            self.thinking.cancel()
+            self.thinking = None
+        if self.pondering is not None:
+            self.pondering.cancel()
+            self.pondering = None
+
+    def ai_done(self, turn):
+        self.thinking = None
+        self.gui.disable_move_now()
+        self.ai_player.apply_turn(turn)
+        self.record_turn(turn)
+        if self.stats_file is not None and self.ai_player.stats is not None:
+            self.ai_player.stats.dump(self.stats_file)
         self.gui.update_board_display()
         self.switch_turn()
         self.total_moves += 1
         if not self.is_game_over():
+            if self.ponder:
+                self.start_pondering()
             self.play_turn()
 
     def start_human_turn(self):
         self.moved_pieces.clear()  # Reset moved pieces at turn start
         self.available_pieces = [(x, y) for x in range(self.board.size) 
                         for y in range(self.board.size) 
-                        if self.board.grid[x][y] == 'O']
+                        if self.board.piece_at(x, y) == 'O']
         self.gui.moves_remaining = 2
         self.gui.set_info("Select a piece to move. Moves remaining: 2")
         self.gui.enable_piece_selection(self.available_pieces)
@@ -85,6 +225,8 @@ class Game:
             self.gui.error("Invalid Move: You cannot move in that direction.")
             return
         self.human_player.execute_move(x, y, direction)
+        dx, dy = DIRECTIONS[direction]
+        self.human_moves.append((x * self.board.size + y, (x + dx) * self.board.size + y + dy))
         self.after_human_piece_moved()
 
     def execute_human_move_coords(self, x, y):
@@ -103,12 +245,16 @@ class Game:
             return
             
         self.human_player.execute_move_coords(sx, sy, x, y)
+        self.human_moves.append((sx * self.board.size + sy, x * self.board.size + y))
         self.moved_pieces.add((x, y))  # Track moved piece
         self.gui.disable_direction_buttons()
         self.gui.update_board_display()
 
         # Check for immediate game over
         if self.board.triangle == 0:
+            self.cancel_ai()
+            self.record_turn(tuple(self.human_moves))
+            self.record_end("Human wins!")
             self.gui.game_over("Human wins!")
             return
 
@@ -130,6 +276,7 @@ class Game:
 
     def end_human_turn(self):
         self.gui.disable_direction_buttons()
+        self.record_turn(tuple(self.human_moves))
         self.switch_turn()
         self.total_moves += 1
         if not self.is_game_over():
@@ -139,24 +286,31 @@ class Game:
         self.turn = "Human" if self.turn == "AI" else "AI"
 
     def is_game_over(self):
-        if self.board.triangle == 0 and self.board.circle > 0:
-            self.gui.game_over("Human wins!")
-            return True
-        elif self.board.circle == 0 and self.board.triangle > 0:
-            self.gui.game_over("AI wins!")
-            return True
-        elif self.board.circle == 0 and self.board.triangle == 0:
-            self.gui.game_over("It's a draw!")
-            return True
-        elif self.total_moves >= 50:
-            if self.board.triangle > self.board.circle:
-                self.gui.game_over("AI wins!")
-            elif self.board.triangle < self.board.circle:
-                self.gui.game_over("Human wins!")
-            else:
-                self.gui.game_over("It's a draw!")
-            return True
-        return False
+        result = game_result(self.board, self.total_moves)
+        if result is None:
+            return False
+        self.cancel_ai()
+        self.record_end(result)
+        self.gui.game_over(result)
+        return True
+
+    # the record gets every turn as it is played, so a crash loses at most the turn in progress
+    def record_turn(self, turn):
+        self.human_moves = []
+        if self.recorder is not None and self.recorder.playing:
+            self.recorder.turn(turn)
+            self.recorder.flush()
+
+    def record_end(self, result):
+        if self.recorder is not None and self.recorder.playing:
+            self.recorder.end(result)
+
+    # stop searching, shut down the search processes and close the record, the window is going away
+    def close(self):
+        self.cancel_ai()
+        self.ai_player.close()
+        if self.recorder is not None:
+            self.recorder.close()
 
     def return_total_moves(self):
         return self.total_moves
@@ -165,13 +319,13 @@ class Game:
         # Check if any unmoved pieces can make valid moves
         for x in range(self.board.size):
             for y in range(self.board.size):
-                if (self.board.grid[x][y] == piece_type and 
+                if (self.board.piece_at(x, y) == piece_type and 
                     (x, y) not in self.moved_pieces):
                     # Check all possible directions
                     for dx, dy in DIRECTIONS.values():
                         new_x, new_y = x + dx, y + dy
                         if (0 <= new_x < self.board.size and 
                             0 <= new_y < self.board.size and 
-                            self.board.grid[new_x][new_y] == '.'):
+                            self.board.piece_at(new_x, new_y) == '.'):
                             return True
         return False
\ No newline at end of file
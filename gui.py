@@ -4,6 +4,14 @@
 import tkinter as tk
 from tkinter import messagebox
 
+from bitboard import bits
+
+# cell size in pixels and the font of the pieces and coordinates
+CELL = 44
+CELL_FONT = ("Arial", 16)
+PIECE_COLORS = {'T': "lightblue", 'O': "lightgreen", '.': "white"}
+
+
 class GameGUI:
     def __init__(self, game):
         # setup game window and controls
@@ -17,24 +25,26 @@ class GameGUI:
         self.main_frame = tk.Frame(self.root)
         self.main_frame.pack(pady=10)
 
-        self.cells = []
-        cell_font = ("Arial", 16)
+        # the board is one canvas, every cell a rectangle and a text item that are only
+        # reconfigured when the cell changes (see paint)
         size = self.game.board.size
+        self.canvas = tk.Canvas(self.main_frame, width=(size + 1) * CELL, height=(size + 1) * CELL,
+                                highlightthickness=0)
+        self.canvas.pack()
+        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.cells = []  # (rectangle, text) item handles per cell index
         for i in range(size + 1):
-            row_cells = []
             for j in range(size + 1):
-                if i == 0 and j == 0:
-                    lbl = tk.Label(self.main_frame, width=3, height=1, font=cell_font, borderwidth=2, relief="groove", bg="lightgray", text="")
-                elif i == 0:
-                    lbl = tk.Label(self.main_frame, width=3, height=1, font=cell_font, borderwidth=2, relief="groove", bg="lightgray", text=str(j-1))
-                elif j == 0:
-                    lbl = tk.Label(self.main_frame, width=3, height=1, font=cell_font, borderwidth=2, relief="groove", bg="lightgray", text=str(i-1))
-                else:
-                    lbl = tk.Label(self.main_frame, width=3, height=1, font=cell_font, borderwidth=2, relief="groove")
-                    lbl.bind("<Button-1>", lambda e, x=i-1, y=j-1: self.on_cell_click(x, y))
-                lbl.grid(row=i, column=j)
-                row_cells.append(lbl)
-            self.cells.append(row_cells)
+                x0, y0 = j * CELL, i * CELL
+                rectangle = self.canvas.create_rectangle(x0, y0, x0 + CELL, y0 + CELL, outline="gray",
+                                                         fill="lightgray" if i == 0 or j == 0 else "white")
+                label = str(j - 1) if i == 0 and j else str(i - 1) if j == 0 and i else ""
+                text = self.canvas.create_text(x0 + CELL // 2, y0 + CELL // 2, text=label, font=CELL_FONT)
+                if i and j:
+                    self.cells.append((rectangle, text))
+        # what the canvas shows: the bitboards and the highlighted cells with their colour
+        self.shown_t = self.shown_o = 0
+        self.shown_highlights = {}
 
         self.info_label = tk.Label(self.root, text="Welcome!")
         self.info_label.pack()
@@ -51,7 +61,12 @@ class GameGUI:
         self.down_button = tk.Button(self.buttons_frame, text="Down", command=lambda: self.game.execute_human_move_direction("down"))
         self.down_button.grid(row=2, column=1)
 
+        self.move_now_button = tk.Button(self.root, text="Move now", command=self.game.force_ai_move)
+        self.move_now_button.pack(pady=5)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
         self.disable_direction_buttons()
+        self.disable_move_now()
         self.moves_remaining = 2
         self.selected_piece = None
 
@@ -60,26 +75,35 @@ class GameGUI:
         self.game.run()
         self.root.mainloop()
 
-    # update the board display
+    # update the board display, the selected piece is orange
     def update_board_display(self):
-        board = self.game.board
-        size = board.size
-        for i in range(size):
-            for j in range(size):
-                piece = board.grid[i][j]
-                color = "white"
-                text = ""
-                if piece == "T":
-                    text = "T"
-                    color = "lightblue"
-                elif piece == "O":
-                    text = "O"
-                    color = "lightgreen"
-                self.cells[i+1][j+1].config(text=text, bg=color)
-
+        highlights = {}
         if self.selected_piece:
             x, y = self.selected_piece
-            self.cells[x+1][y+1].config(bg="orange")
+            highlights[x * self.game.board.size + y] = "orange"
+        self.paint(highlights)
+
+    # repaint only the cells whose piece or highlight changed since the last paint, the changed
+    # pieces are the moved ones and the captured squares, found from the bitboards
+    def paint(self, highlights):
+        board = self.game.board
+        size = board.size
+        dirty = set(bits((board.t ^ self.shown_t) | (board.o ^ self.shown_o)))
+        for i in set(highlights) | set(self.shown_highlights):
+            if highlights.get(i) != self.shown_highlights.get(i):
+                dirty.add(i)
+        for i in dirty:
+            piece = board.piece_at(*divmod(i, size))
+            rectangle, text = self.cells[i]
+            self.canvas.itemconfig(rectangle, fill=highlights.get(i, PIECE_COLORS[piece]))
+            self.canvas.itemconfig(text, text="" if piece == '.' else piece)
+        self.shown_t, self.shown_o, self.shown_highlights = board.t, board.o, highlights
+
+    # a click on the canvas, the coordinate row and column are ignored
+    def on_canvas_click(self, event):
+        x, y = event.y // CELL - 1, event.x // CELL - 1
+        if 0 <= x < self.game.board.size and 0 <= y < self.game.board.size:
+            self.on_cell_click(x, y)
 
     # handle cell click event
     def on_cell_click(self, x, y):
@@ -98,7 +122,7 @@ class GameGUI:
             return
 
         if not self.selected_piece:
-            if self.game.board.grid[x][y] == "O" and self.moves_remaining > 0:
+            if self.game.board.piece_at(x, y) == "O" and self.moves_remaining > 0:
                 self.selected_piece = (x, y)
                 self.update_board_display()
                 self.enable_direction_buttons()
@@ -106,7 +130,7 @@ class GameGUI:
                 self.error("Please select one of your pieces.")
         else:
             sx, sy = self.selected_piece
-            if abs(x - sx) + abs(y - sy) == 1 and self.game.board.grid[x][y] == ".":
+            if abs(x - sx) + abs(y - sy) == 1 and self.game.board.piece_at(x, y) == ".":
                 self.game.execute_human_move_coords(x, y)
                 self.selected_piece = None
                 self.moves_remaining -= 1
@@ -116,9 +140,25 @@ class GameGUI:
                     self.game.end_human_turn()
 
     # set info label text
+    # the last ai search is shown under it when the game collects stats
     def set_info(self, text):
+        stats = self.game.ai_player.stats
+        if stats is not None and stats.iterations:
+            text = f"{text}\nAI search: {stats.summary()}"
         self.info_label.config(text=text)
 
+    # stop the ai thread before the window goes
+    def close(self):
+        self.game.close()
+        self.root.destroy()
+
+    # the ai can be told to play its best turn so far while it thinks
+    def enable_move_now(self):
+        self.move_now_button.config(state="normal")
+
+    def disable_move_now(self):
+        self.move_now_button.config(state="disabled")
+
     # show error message
     def error(self, text):
         messagebox.showerror("Error", text)
@@ -146,9 +186,14 @@ class GameGUI:
         self.available_pieces = available_pieces
         self.highlight_available_pieces()
 
-    # highlight available pieces
+    # highlight available pieces in yellow, until the next update_board_display
     def highlight_available_pieces(self):
-        self.update_board_display()
+        size = self.game.board.size
+        highlights = {}
+        if self.selected_piece:
+            x, y = self.selected_piece
+            highlights[x * size + y] = "orange"
         for x, y in self.available_pieces:
-            if self.game.board.grid[x][y] == 'O':
-                self.cells[x+1][y+1].config(bg="yellow")
+            if self.game.board.piece_at(x, y) == 'O':
+                highlights[x * size + y] = "yellow"
+        self.paint(highlights)
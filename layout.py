@@ -0,0 +1,60 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# board variants: the board size and the starting cells of each side
+# the standard game is 7x7 with 4 pieces a side, default_layout spreads any number of pieces
+# over the first and last columns the same way for other sizes
+class Layout:
+    def __init__(self, size, t_cells, o_cells):
+        # t_cells and o_cells are (x, y) coordinates of the ai and human pieces
+        if size < 3:
+            raise ValueError(f"Board size must be at least 3, got {size}")
+        self.size = size
+        self.t_cells = tuple(t_cells)
+        self.o_cells = tuple(o_cells)
+        cells = self.t_cells + self.o_cells
+        if any(not (0 <= x < size and 0 <= y < size) for x, y in cells):
+            raise ValueError(f"Starting cells must be on the {size}x{size} board")
+        if len(set(cells)) != len(cells):
+            raise ValueError("Starting cells overlap")
+
+    def __repr__(self):
+        return f"Layout({self.size}, {self.t_cells}, {self.o_cells})"
+
+    def __eq__(self, other):
+        return isinstance(other, Layout) and (self.size, self.t_cells, self.o_cells) == \
+            (other.size, other.t_cells, other.o_cells)
+
+    def __hash__(self):
+        return hash((self.size, self.t_cells, self.o_cells))
+
+
+# pieces alternate between the first and last column on every other row, T from the top left
+# and bottom right corners, O from the other two, the standard layout for size 7 and 4 pieces
+# when those columns are full the next pieces go two columns further in
+def default_layout(size=7, pieces=4):
+    if pieces < 1:
+        raise ValueError(f"Each side needs at least one piece, got {pieces}")
+    last = size - 1
+    per_column = (size + 1) // 4  # rows a side gets in one column
+    if per_column < 1:
+        raise ValueError(f"Board size must be at least 3, got {size}")
+    # every column gets per_column pieces of each side in two rows, columns go two apart
+    if pieces > 2 * per_column * (last // 2 + 1):
+        raise ValueError(f"{pieces} pieces a side do not fit on a {size}x{size} board")
+    t_cells = []
+    o_cells = []
+    for i in range(pieces):
+        column, j = divmod(i, 2 * per_column)
+        row = 2 * (j // 2)
+        if j % 2 == 0:
+            t_cells.append((row, 2 * column))
+            o_cells.append((last - row, 2 * column))
+        else:
+            t_cells.append((last - row, last - 2 * column))
+            o_cells.append((row, last - 2 * column))
+    if any(not 0 <= y <= last for _, y in t_cells) or len(set(t_cells + o_cells)) != 2 * pieces:
+        raise ValueError(f"{pieces} pieces a side do not fit on a {size}x{size} board")
+    return Layout(size, t_cells, o_cells)
+
+
+STANDARD = default_layout()
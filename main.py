@@ -1,9 +1,25 @@
 #Kagan Tek - 20210702027 - Strategic Board Game With AI
 
+import argparse
+
 from game import Game
 from gui import GameGUI
+from layout import default_layout
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="Strategic Board Game With AI")
+    parser.add_argument('--stats', action='store_true', help='show ai search statistics')
+    parser.add_argument('--stats-file', default=None, help='append ai search statistics to this jsonl file')
+    parser.add_argument('--ponder', action='store_true', help='let the ai think during the human turn')
+    parser.add_argument('--record', default=None, help='append the game to this game record file')
+    parser.add_argument('--size', type=int, default=7, help='board size')
+    parser.add_argument('--pieces', type=int, default=4, help='pieces per side')
+    parser.add_argument('--engine', choices=('alphabeta', 'mcts'), default='alphabeta', help='ai search engine')
+    parser.add_argument('--time-ms', type=int, default=None, help='ai thinking time per turn in ms')
+    parser.add_argument('--workers', default=None, help='processes the ai searches with, or "auto"')
+    args = parser.parse_args()
+    game = Game(stats=args.stats, stats_file=args.stats_file, ponder=args.ponder, record_file=args.record,
+                layout=default_layout(args.size, args.pieces), engine=args.engine,
+                time_budget_ms=args.time_ms, workers=args.workers)
     gui = GameGUI(game)
     gui.run()
@@ -0,0 +1,367 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# monte carlo tree search player, a drop-in for AI with the same play_turn / choose_turn contract
+# every iteration walks the tree by UCT to a node with untried turns, adds one child, plays the game
+# out with random moves on a copy of the board (a capturing move is preferred) and backs the result up
+# the tree is kept between turns, the next search starts from the node of the position on the board
+# with workers > 1 every process grows its own tree from the root and the root visit counts are summed
+# usage: python mcts.py --games 6 --playouts 2000 --depth 2  (head-to-head against the minimax AI)
+import argparse
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import SIZE, BitBoard
+from constants import MAX_TURNS
+from parallel import SearchGame, resolve_workers
+
+# exploration constant of the UCT formula
+EXPLORATION = 1.4
+
+# how often a playout plays a capturing move when it has one
+CAPTURE_BIAS = 0.8
+
+# playouts per turn without a time budget
+PLAYOUTS = 1000
+
+# seconds between progress reports while searching
+PROGRESS_INTERVAL = 0.25
+
+
+def side_to_move(total_moves):
+    return 'T' if total_moves % 2 == 0 else 'O'
+
+
+# 1.0 when T has won, 0.0 when O has, 0.5 for a draw and None while the game goes on, as in game_result
+def outcome(board, total_moves):
+    if board.triangle == 0 or board.circle == 0 or total_moves >= MAX_TURNS:
+        if board.triangle > board.circle:
+            return 1.0
+        if board.triangle < board.circle:
+            return 0.0
+        return 0.5
+    return None
+
+
+class Node:
+    __slots__ = ('turn', 'parent', 'piece', 'position', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, turn, parent, piece, position):
+        # piece is the side to move here, wins count for the side that played turn to get here
+        self.turn = turn
+        self.parent = parent
+        self.piece = piece
+        self.position = position  # (t, o) bitboards
+        self.children = []
+        self.untried = None  # turns not expanded yet, generated on the first visit
+        self.visits = 0
+        self.wins = 0.0
+
+    def most_visited(self):
+        return max(self.children, key=lambda child: child.visits, default=None)
+
+
+# one iteration budget of a root parallel search, run in a worker process
+def _search_tree(task):
+    t, o, size, total_moves, piece, playouts, wall_deadline, seed = task
+    board = BitBoard.empty(size)
+    board.set_position(t, o)
+    deadline = time.perf_counter() + wall_deadline - time.time() if wall_deadline is not None else float('inf')
+    mcts = MCTS(board, SearchGame(total_moves), piece=piece, seed=seed)
+    mcts.new_root()
+    mcts.search(deadline, playouts)
+    return mcts.playouts, [(child.turn, child.visits, child.wins) for child in mcts.root.children]
+
+
+class MCTS:
+    def __init__(self, board, game, playouts=PLAYOUTS, time_budget_ms=None, piece='T', workers=None,
+                 exploration=EXPLORATION, capture_bias=CAPTURE_BIAS, seed=None):
+        # playouts per turn, or as many as fit in time_budget_ms when that is set
+        # workers spreads the playouts over that many processes, "auto" uses every core,
+        # their trees are not kept between turns and stop() does not reach them
+        # seed makes the playouts repeatable
+        # piece is the side to move at the root, below it the sides take turns
+        self.board = board
+        self.game = game
+        self.playouts_per_turn = playouts
+        self.time_budget_ms = time_budget_ms
+        self.piece = piece
+        self.workers = resolve_workers(workers)
+        self.exploration = exploration
+        self.capture_bias = capture_bias
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.executor = None
+        self.stats = None  # the minimax search counters do not apply
+        self.root = None
+        self.root_moves = 0
+        self.playouts = 0
+        self.progress = None  # called with a progress dict now and then while searching
+        self.stopped = False  # set by stop(), possibly from another thread
+        self.turn_started = 0.0
+        self.deadline = float('inf')
+
+    def play_turn(self):
+        best_turn = self.choose_turn()
+        self.apply_turn(best_turn)
+        return best_turn
+
+    # search the board for the turn to play without playing it, ponder runs in this process
+    def choose_turn(self, ponder=False):
+        self.stopped = False
+        self.turn_started = time.perf_counter()
+        self.playouts = 0
+        # a ponder search with a time budget runs until ponder_hit starts its clock or it is stopped
+        if self.time_budget_ms:
+            self.deadline = float('inf') if ponder else self.turn_started + self.time_budget_ms / 1000
+            playouts = float('inf')
+        else:
+            self.deadline, playouts = float('inf'), self.playouts_per_turn
+        if self.workers > 1 and not ponder:
+            return self.search_parallel(playouts)
+        self.reuse_root()
+        self.search(self.deadline, playouts)
+        best = self.root.most_visited()
+        return best.turn if best is not None else ()
+
+    def apply_turn(self, turn):
+        for src, dst in turn or ():
+            x, y = divmod(src, self.board.size)
+            new_x, new_y = divmod(dst, self.board.size)
+            self.board.move_piece_by_coords(x, y, new_x, new_y)
+
+    # end the running search as soon as possible, safe to call from another thread
+    def stop(self):
+        self.stopped = True
+
+    # the human played the pondered reply, pondering time counts towards the usual budget
+    # a playout budget was already searched in full while pondering
+    def ponder_hit(self):
+        if self.time_budget_ms:
+            self.deadline = self.turn_started + self.time_budget_ms / 1000
+
+    # the most visited human reply below the node of the position on the board, or None
+    def expected_reply(self):
+        node = self.find_node(self.board, self.game.return_total_moves())
+        if node is None:
+            return None
+        reply = node.most_visited()
+        if reply is None or reply.turn not in self.board.legal_turns(node.piece):
+            return None
+        return reply.turn
+
+    def new_root(self):
+        self.root_moves = self.game.return_total_moves()
+        self.root = Node(None, None, self.piece, (self.board.t, self.board.o))
+
+    # the node of the board position in the kept tree, at most two turns below the old root
+    def find_node(self, board, total_moves):
+        if self.root is None:
+            return None
+        position = (board.t, board.o)
+        level = [self.root]
+        for depth in range(3):
+            if self.root_moves + depth == total_moves:
+                for node in level:
+                    if node.position == position:
+                        return node
+                return None
+            level = [child for node in level for child in node.children]
+        return None
+
+    # keep the subtree of the position on the board, or start a new tree
+    def reuse_root(self):
+        node = self.find_node(self.board, self.game.return_total_moves())
+        if node is None or node.piece != self.piece:
+            self.new_root()
+            return
+        node.parent = None
+        self.root = node
+        self.root_moves = self.game.return_total_moves()
+
+    # the first playout always runs so the root has a turn to play
+    def search(self, deadline, playouts):
+        next_report = time.perf_counter() + PROGRESS_INTERVAL
+        while self.playouts < playouts:
+            self.iterate()
+            self.playouts += 1
+            now = time.perf_counter()
+            if self.stopped or now > min(deadline, self.deadline):
+                break
+            if self.progress is not None and now > next_report:
+                next_report = now + PROGRESS_INTERVAL
+                self.report_progress(now)
+
+    def report_progress(self, now):
+        elapsed = now - self.turn_started
+        pv = []
+        node = self.root.most_visited()
+        while node is not None:
+            pv.append(node)
+            node = node.most_visited()
+        turn = pv[0].turn if pv else ()
+        size = self.board.size
+        self.progress({
+            'depth': len(pv),
+            'completed_depth': len(pv),
+            'best_turn': [(divmod(src, size), divmod(dst, size)) for src, dst in turn],
+            'score': pv[0].wins / pv[0].visits if pv else None,
+            'nodes': self.playouts,
+            'nodes_per_s': self.playouts / elapsed if elapsed > 0 else 0.0,
+            'elapsed_ms': elapsed * 1000,
+        })
+
+    # selection, expansion, playout and backup on a copy of the root position
+    def iterate(self):
+        node = self.root
+        board = self.board.copy()
+        total_moves = self.root_moves
+        while node.untried == [] and node.children:
+            node = self.select(node)
+            board.make_turn(node.turn)
+            total_moves += 1
+        result = outcome(board, total_moves)
+        if result is None:
+            if node.untried is None:
+                node.untried = board.legal_turns(node.piece)
+                self.rng.shuffle(node.untried)
+            turn = node.untried.pop()
+            board.make_turn(turn)
+            total_moves += 1
+            child = Node(turn, node, 'O' if node.piece == 'T' else 'T', (board.t, board.o))
+            node.children.append(child)
+            node = child
+            result = self.playout(board, total_moves, child.piece)
+        while node is not None:
+            node.visits += 1
+            if node.parent is not None:
+                node.wins += result if node.parent.piece == 'T' else 1.0 - result
+            node = node.parent
+
+    # UCT: win rate of the child for the side to move plus an exploration bonus for rarely tried ones
+    def select(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best, best_value = None, float('-inf')
+        for child in node.children:
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    # random moves to the end of the game with piece to move first, two by different pieces a turn,
+    # captures preferred
+    def playout(self, board, total_moves, piece):
+        while True:
+            result = outcome(board, total_moves)
+            if result is not None:
+                return result
+            moved = self.random_move(board, piece, None)
+            if moved is not None and board.triangle and board.circle:
+                self.random_move(board, piece, moved)
+            piece = 'O' if piece == 'T' else 'T'
+            total_moves += 1
+
+    # play a random move of piece not starting on cell exclude, returns its destination or None
+    def random_move(self, board, piece, exclude):
+        rng = self.rng
+        if rng.random() < self.capture_bias:
+            moves = [move for move in board.capture_moves(piece) if move[0] != exclude]
+            if moves:
+                move = rng.choice(moves)
+                board.make_move(*move)
+                return move[1]
+        moves = [move for move in board.legal_moves(piece) if move[0] != exclude]
+        if not moves:
+            return None
+        move = rng.choice(moves)
+        board.make_move(*move)
+        return move[1]
+
+    # every worker searches its share of the playouts from the root, their root visits are summed
+    def search_parallel(self, playouts):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        share = math.ceil(playouts / self.workers) if playouts != float('inf') else float('inf')
+        wall_deadline = time.time() + self.deadline - time.perf_counter() if self.deadline != float('inf') else None
+        base = self.rng.getrandbits(32)
+        tasks = [(self.board.t, self.board.o, self.board.size, self.game.return_total_moves(), self.piece,
+                  share, wall_deadline, base + i) for i in range(self.workers)]
+        totals = {}
+        for done, children in self.executor.map(_search_tree, tasks):
+            self.playouts += done
+            for turn, visits, wins in children:
+                total = totals.setdefault(turn, [0, 0.0])
+                total[0] += visits
+                total[1] += wins
+        self.root = None  # the merged tree is not kept
+        if not totals:
+            return ()
+        return max(totals, key=lambda turn: totals[turn][0])
+
+    # stop the worker processes
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+# games between the two engines from random two-turn openings, each engine plays both sides of an opening
+# returns (mcts wins, minimax wins, draws)
+def play_match(games=6, playouts=PLAYOUTS, depth=2, time_budget_ms=None, workers=None, seed=2021, log=None):
+    from ai import AI
+    from game import game_result
+    rng = random.Random(seed)
+    score = [0, 0, 0]
+    for game_index in range(games):
+        mcts_piece = 'T' if game_index % 2 == 0 else 'O'
+        if game_index % 2 == 0:
+            opening = rng.getrandbits(32)
+        opening_rng = random.Random(opening)
+        board = BitBoard()
+        game = SearchGame(0)
+        for _ in range(2):
+            board.make_turn(opening_rng.choice(board.legal_turns(side_to_move(game.total_moves))))
+            game.total_moves += 1
+        mcts = MCTS(board, game, playouts=playouts, time_budget_ms=time_budget_ms, piece=mcts_piece,
+                    workers=workers, seed=rng.getrandbits(32))
+        minimax = AI(board, game, depth=depth, time_budget_ms=time_budget_ms,
+                     piece='O' if mcts_piece == 'T' else 'T')
+        players = {mcts_piece: mcts, minimax.piece: minimax}
+        try:
+            while game_result(board, game.total_moves) is None:
+                players[side_to_move(game.total_moves)].play_turn()
+                game.total_moves += 1
+        finally:
+            mcts.close()
+            minimax.close()
+        result = outcome(board, game.total_moves)
+        if result == 0.5:
+            score[2] += 1
+        elif (result == 1.0) == (mcts_piece == 'T'):
+            score[0] += 1
+        else:
+            score[1] += 1
+        if log:
+            log(f"game {game_index + 1}: mcts plays {mcts_piece}, {game_result(board, game.total_moves)} "
+                f"{board.triangle}-{board.circle}")
+    return tuple(score)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo tree search against the minimax AI")
+    parser.add_argument('--games', type=int, default=6)
+    parser.add_argument('--playouts', type=int, default=PLAYOUTS, help='mcts playouts per turn')
+    parser.add_argument('--depth', type=int, default=2, help='minimax depth in whole turns')
+    parser.add_argument('--time-ms', type=float, default=None, help='time budget per turn for both engines')
+    parser.add_argument('--workers', default=None, help='mcts processes, or "auto"')
+    args = parser.parse_args(argv)
+    log = lambda text: print(text, file=sys.stderr)
+    wins, losses, draws = play_match(args.games, args.playouts, args.depth, args.time_ms, args.workers, log=log)
+    print(f"mcts {wins} wins, minimax {losses} wins, {draws} draws")
+
+
+if __name__ == "__main__":
+    main()
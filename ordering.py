@@ -0,0 +1,180 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# move ordering for the turn search
+# the table's best turn goes first, then turns that capture, then the killer turns of the ply,
+# then the rest by history score, turns with equal scores keep generation order
+# nodes whose children are leaves only put the best turn and the killers first, see leaf_turns
+# the history table lives as long as the ai, so it carries over from one game turn to the next
+# usage: python ordering.py [depth]  (nodes searched with and without ordering on fixed positions)
+import random
+import sys
+import time
+from operator import itemgetter
+
+from bitboard import BitBoard
+
+KILLERS_PER_PLY = 2
+BEST_SCORE = 1 << 40
+CAPTURE_SCORE = 1 << 32
+KILLER_SCORE = 1 << 31
+
+
+class MoveOrdering:
+    def __init__(self):
+        self.killers = {}  # ply -> most recent cutoff turns that did not capture
+        self.history = {'T': {}, 'O': {}}  # turn -> sum of depth * depth over its cutoffs
+
+    def clear(self):
+        self.killers.clear()
+        for table in self.history.values():
+            table.clear()
+
+    # called once per game turn, killers are position specific so they go and history is halved
+    def new_turn(self):
+        self.killers.clear()
+        for piece, table in self.history.items():
+            self.history[piece] = {turn: score >> 1 for turn, score in table.items() if score > 1}
+
+    # all legal turns of piece, best first
+    def order(self, board, piece, ply, best_turn):
+        scored = list(self.scored_turns(board, piece, ply, best_turn))
+        scored.sort(key=itemgetter(0), reverse=True)
+        return [turn for _, turn in scored]
+
+    # turns of a node whose children are leaves, each yielded while it is played on the board
+    # as iter_turns does: the table's best turn, the killer turns of the ply that can be played
+    # here, then the rest in generation order
+    # sorting them all would mean generating every turn before the first leaf is scored, and at
+    # this depth a cutoff usually comes well before the generator is done
+    def leaf_turns(self, board, piece, ply, best_turn):
+        # positions already yielded, by the same key iter_turns uses, so the same position reached
+        # with the moves in the other order is not searched twice
+        cells = board.geo.cells
+        seen = set()
+        tried = []
+        for turn in (best_turn,) + tuple(self.killers.get(ply, ())):
+            if turn is None or turn in tried or (turn != best_turn and not playable(board, piece, turn)):
+                continue
+            tried.append(turn)
+            undos = board.make_turn(turn)
+            try:
+                position = board.t << cells | board.o
+                if position not in seen:
+                    seen.add(position)
+                    yield turn
+            finally:
+                board.unmake_turn(undos)
+        turns = board.iter_turns(piece)
+        try:
+            for turn in turns:
+                if (board.t << cells | board.o) not in seen:
+                    yield turn
+        finally:
+            turns.close()
+
+    # (sort score, turn) of every legal turn, yielded while the turn is played on the board
+    def scored_turns(self, board, piece, ply, best_turn):
+        history = self.history[piece]
+        killers = self.killers.get(ply, ())
+        if piece == 'T':
+            own, opp = board.triangle, board.circle
+        else:
+            own, opp = board.circle, board.triangle
+        turns = board.iter_turns(piece)
+        try:
+            # captures are read off the board while the generator has each turn played
+            for turn in turns:
+                if piece == 'T':
+                    gain = (opp - board.circle) - (own - board.triangle)
+                else:
+                    gain = (opp - board.triangle) - (own - board.circle)
+                if turn == best_turn:
+                    score = BEST_SCORE
+                elif gain:
+                    # turns that lose material go last
+                    score = CAPTURE_SCORE + gain if gain > 0 else gain - CAPTURE_SCORE
+                elif turn in killers:
+                    score = KILLER_SCORE - killers.index(turn)
+                else:
+                    score = history.get(turn, 0)
+                yield score, turn
+        finally:
+            turns.close()
+
+    # a quiet turn caused a beta cutoff at this ply with depth turns left
+    def cutoff(self, piece, ply, depth, turn):
+        killers = self.killers.setdefault(ply, [])
+        if turn not in killers:
+            killers.insert(0, turn)
+            del killers[KILLERS_PER_PLY:]
+        history = self.history[piece]
+        history[turn] = history.get(turn, 0) + depth * depth
+
+
+# whether a two move turn found in another position can be played on this board: both moves
+# are a step of an own piece to an empty neighbour and the second moves another piece
+def playable(board, piece, turn):
+    if len(turn) != 2 or turn[0][1] == turn[1][0]:
+        return False
+    undos = []
+    try:
+        for src, dst in turn:
+            own = board.t if piece == 'T' else board.o
+            bit = board.geo.bit
+            x, y = divmod(src, board.size)
+            new_x, new_y = divmod(dst, board.size)
+            if not own & bit[src] or abs(x - new_x) + abs(y - new_y) != 1 or (board.t | board.o) & bit[dst]:
+                return False
+            if undos and (not board.triangle or not board.circle):
+                return False
+            undos.append(board.make_move(src, dst))
+        return True
+    finally:
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+
+
+# positions a few random turns into a game, the same ones every run
+def sample_positions(count=8, seed=2021):
+    rng = random.Random(seed)
+    positions = []
+    for i in range(count):
+        board = BitBoard()
+        for ply in range(2 + i % 4 * 2):
+            turns = board.legal_turns('T' if ply % 2 == 0 else 'O')
+            board.make_turn(rng.choice(turns))
+        positions.append((board, 2 + i % 4 * 2))
+    return positions
+
+
+# nodes and time for the same searches with and without move ordering, the chosen turns must agree
+def measure_node_reduction(depth=3, positions=None):
+    from ai import AI
+    from parallel import SearchGame
+    if positions is None:
+        positions = sample_positions()
+    results = []
+    for board, total_moves in positions:
+        row = {'depth': depth, 'total_moves': total_moves}
+        chosen = []
+        for name, ordering in (('plain', False), ('ordered', True)):
+            ai = AI(board.copy(), SearchGame(total_moves), depth=depth, ordering=ordering)
+            ai.prepare_tables()
+            started = time.perf_counter()
+            chosen.append(ai.search_root(depth))
+            row[name + '_s'] = time.perf_counter() - started
+            row[name + '_nodes'] = ai.nodes
+        row['node_ratio'] = row['ordered_nodes'] / row['plain_nodes']
+        row['same_result'] = chosen[0] == chosen[1]
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    plain = ordered = 0
+    for result in measure_node_reduction(depth):
+        plain += result['plain_nodes']
+        ordered += result['ordered_nodes']
+        print(result)
+    print(f"nodes: {plain} plain, {ordered} ordered ({ordered / plain:.1%})")
@@ -0,0 +1,202 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# parallel root search over a process pool
+# the first root turn is searched in this process and its score becomes the alpha every worker
+# starts from (young brothers wait), the other root turns are spread over the workers
+# workers also share the exact scores of finished root turns, a turn only takes alpha from turns
+# before it in root order, so the chosen turn is the same as the single process search
+# boards travel to the workers as plain integers, not pickled Board/Game objects
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from bitboard import SIZE, BitBoard
+
+# most root turns the shared score array can hold, bigger roots fall back to a single process
+MAX_ROOT_TURNS = 4096
+
+# seconds between checks for a stop or a moved deadline while the workers search
+POLL_INTERVAL = 0.02
+
+_worker = None  # (ai, shared scores) inside each worker process
+
+
+def resolve_workers(workers):
+    # None or 1 is single process, "auto" uses every core
+    if workers == "auto":
+        return os.cpu_count() or 1
+    return int(workers or 1)
+
+
+# stand-in for Game inside the workers, the search only asks it for the move count
+class SearchGame:
+    def __init__(self, total_moves=0):
+        self.total_moves = total_moves
+        self.gui = None
+
+    def return_total_moves(self):
+        return self.total_moves
+
+
+# ai.stopped of a worker, true while the pool's stop flag is set, so a stop reaches searches
+# that are already running
+class SharedStop:
+    def __init__(self, flag):
+        self.flag = flag
+
+    def __bool__(self):
+        return bool(self.flag.value)
+
+
+def _init_worker(scores, stop, options, size):
+    global _worker
+    from ai import AI
+    board = BitBoard.empty(size)
+    ai = AI(board, SearchGame(), **options)
+    ai.stopped = SharedStop(stop)
+    _worker = (ai, scores)
+
+
+def _search_turn(task):
+    from ai import SearchTimeout
+    t, o, total_moves, depth, index, turn, bound, wall_deadline = task
+    ai, scores = _worker
+    board = ai.board
+    board.set_position(t, o)
+    ai.game.total_moves = total_moves
+    ai.prepare_tables()
+    ai.root_depth = depth
+    ai.deadline = None
+    if wall_deadline is not None:
+        ai.deadline = time.perf_counter() + wall_deadline - time.time()
+    # scores are stored times sign, so for either side a bigger stored score is better
+    sign = 1 if ai.piece == 'T' else -1
+    # best exact score of an earlier root turn finished so far
+    bound = max(bound, max(scores[:index]))
+    nodes = ai.nodes
+    undos = board.make_turn(turn)
+    try:
+        if sign > 0:
+            score = ai.minimax(depth - 1, False, bound)
+        else:
+            score = ai.minimax(depth - 1, True, float('-inf'), -bound)
+    except SearchTimeout:
+        return index, None, ai.nodes - nodes
+    finally:
+        ai.deadline = None
+    board.unmake_turn(undos)
+    if sign * score > bound:
+        scores[index] = sign * score
+    return index, score, ai.nodes - nodes
+
+
+class RootPool:
+    def __init__(self, workers, options=None, size=SIZE):
+        # options are passed to the AI built in every worker (tt_entries, eval_cache_entries, piece, weights)
+        # size is the board size the workers search
+        self.workers = resolve_workers(workers)
+        self.scores = multiprocessing.Array('d', MAX_ROOT_TURNS, lock=False)
+        self.stop = multiprocessing.Value('b', 0, lock=False)
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(self.scores, self.stop, options or {}, size))
+
+    # same contract as AI.search_root: best (turn, score) for the ai to depth whole turns
+    def search(self, ai, depth):
+        from ai import SearchTimeout
+        board = ai.board
+        sign = 1 if ai.piece == 'T' else -1
+        turns = board.legal_turns(ai.piece)
+        if len(turns) < 2 or len(turns) > MAX_ROOT_TURNS:
+            return ai.search_root(depth, parallel=False)
+
+        # tablebase scores and the ordering tables count plies from root_depth, as in the workers
+        ai.root_depth = depth
+        undos = ai.make_turn(turns[0])
+        first_score = ai.minimax(depth - 1, sign < 0)
+        ai.unmake_turn(undos)
+        ai.root_best = (turns[0], first_score)
+
+        wall_deadline = None
+        if ai.deadline is not None:
+            wall_deadline = time.time() + ai.deadline - time.perf_counter()
+        self.scores[:len(turns)] = [float('-inf')] * len(turns)
+        self.stop.value = 0
+        total_moves = ai.game.return_total_moves()
+        futures = [
+            self.executor.submit(_search_turn, (board.t, board.o, total_moves, depth, index, turn,
+                                                sign * first_score, wall_deadline))
+            for index, turn in enumerate(turns[1:], 1)
+        ]
+
+        # results come in any order, ties still go to the turn first in root order
+        best_index, best_score = 0, first_score
+        timed_out = False
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                index, score, nodes = future.result()
+                ai.nodes += nodes
+                if score is None:
+                    timed_out = True
+                elif sign * score > sign * best_score or (score == best_score and index < best_index):
+                    best_index, best_score = index, score
+                    ai.root_best = (turns[best_index], best_score)
+            # a stop or a deadline moved by ponder_hit is passed on to the workers, turns not
+            # started yet are dropped and the running ones give up at their next poll
+            if pending and not self.stop.value and (
+                    ai.stopped or (ai.deadline is not None and time.perf_counter() > ai.deadline)):
+                self.stop.value = 1
+                timed_out = True
+                for future in pending:
+                    future.cancel()
+        if timed_out:
+            raise SearchTimeout()
+        return turns[best_index], best_score
+
+    def close(self):
+        self.executor.shutdown()
+
+
+# times single process against pool search on a few positions and checks they agree
+# usage: python parallel.py [workers] [depth]
+def measure_speedup(workers="auto", depth=3, positions=None):
+    from ai import AI
+    if positions is None:
+        positions = [BitBoard()]
+    pool = RootPool(workers)
+    results = []
+    try:
+        for board in positions:
+            serial = AI(board.copy(), SearchGame(), depth=depth)
+            started = time.perf_counter()
+            serial_result = serial.search_root(depth)
+            serial_time = time.perf_counter() - started
+
+            pooled = AI(board.copy(), SearchGame(), depth=depth)
+            pooled.pool = pool
+            started = time.perf_counter()
+            pooled_result = pooled.search_root(depth)
+            pooled_time = time.perf_counter() - started
+            results.append({
+                'workers': pool.workers,
+                'depth': depth,
+                'serial_s': serial_time,
+                'parallel_s': pooled_time,
+                'speedup': serial_time / pooled_time if pooled_time else 0.0,
+                'same_result': serial_result == pooled_result,
+            })
+    finally:
+        pool.close()
+    return results
+
+
+if __name__ == "__main__":
+    workers = sys.argv[1] if len(sys.argv) > 1 else "auto"
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    for result in measure_speedup(workers, depth):
+        print(result)
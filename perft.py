@@ -0,0 +1,240 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# perft: counts the positions and capturing turns to a fixed depth from the benchmark positions
+# the grid Board has no move generator, its turns come from the rules: is_valid_move for every
+# piece and direction, two moves by different pieces, captures by check_captures after each move
+# the BitBoard uses its own legal_turns, so the counts of the two must agree
+# --diff walks both boards side by side and reports the first position where their turns or
+# captures differ, --random also plays random games to the end with both
+# usage: python perft.py --depth 2 [--board grid] [--position start]
+#        python perft.py --diff --depth 2 --random 20
+import argparse
+import random
+import sys
+import time
+
+from benchmark import CORPUS, board_from_rows, load_corpus, rows_of
+from bitboard import BitBoard
+from constants import DIRECTIONS, MAX_TURNS
+
+BOARDS = ('grid', 'bitboard')
+
+
+def opponent_of(piece):
+    return 'O' if piece == 'T' else 'T'
+
+
+# a board of the named implementation from a corpus position's grid Board
+def make_board(name, position):
+    if name == 'bitboard':
+        return BitBoard.from_board(position)
+    if name != 'grid':
+        raise ValueError(f"Unknown board implementation: {name}")
+    return board_from_rows(rows_of(position))
+
+
+# (src, dst) moves of piece allowed by is_valid_move, in the order of BitBoard.legal_moves
+def reference_moves(board, piece):
+    size = board.size
+    grid = board.grid
+    moves = []
+    for x in range(size):
+        for y in range(size):
+            if grid[x][y] != piece:
+                continue
+            for dx, dy in DIRECTIONS.values():
+                if board.is_valid_move(x, y, x + dx, y + dy):
+                    moves.append((x * size + y, (x + dx) * size + y + dy))
+    return moves
+
+
+# turns of piece by the rules: two moves by different pieces, one when the second piece cannot
+# move or the first move ended the game, none when no piece can move
+# turns that reach a position already reached are left out, as legal_turns does
+def reference_turns(board, piece):
+    first_moves = reference_moves(board, piece)
+    if not first_moves:
+        return [()]
+    turns = []
+    seen = set()
+    for first in first_moves:
+        undo = board.make_move(*first)
+        second_moves = []
+        if board.triangle and board.circle:
+            second_moves = [move for move in reference_moves(board, piece) if move[0] != first[1]]
+        if not second_moves:
+            key = rows_of(board)
+            if key not in seen:
+                seen.add(key)
+                turns.append((first,))
+        for second in second_moves:
+            undo_second = board.make_move(*second)
+            key = rows_of(board)
+            if key not in seen:
+                seen.add(key)
+                turns.append((first, second))
+            board.unmake_move(undo_second)
+        board.unmake_move(undo)
+    return turns
+
+
+def turns_of(board, piece):
+    if isinstance(board, BitBoard):
+        return board.legal_turns(piece)
+    return reference_turns(board, piece)
+
+
+def play(board, turn):
+    return [board.make_move(src, dst) for src, dst in turn]
+
+
+def take_back(board, undos):
+    for undo in reversed(undos):
+        board.unmake_move(undo)
+
+
+# adds the positions depth turns ahead to counts['nodes'], the turns into them that captured
+# to counts['captures'] and the games that ended on the way to counts['ended']
+def perft(board, piece, depth, counts=None):
+    if counts is None:
+        counts = {'nodes': 0, 'captures': 0, 'ended': 0}
+    if depth == 0:
+        counts['nodes'] += 1
+        return counts
+    if not board.triangle or not board.circle:
+        counts['ended'] += 1
+        return counts
+    for turn in turns_of(board, piece):
+        pieces = board.triangle + board.circle
+        undos = play(board, turn)
+        if depth == 1 and board.triangle + board.circle < pieces:
+            counts['captures'] += 1
+        perft(board, opponent_of(piece), depth - 1, counts)
+        take_back(board, undos)
+    return counts
+
+
+# the positions after every turn of piece, by their rows
+def children(board, piece):
+    found = {}
+    for turn in turns_of(board, piece):
+        undos = play(board, turn)
+        found[rows_of(board)] = (turn, board.triangle, board.circle)
+        take_back(board, undos)
+    return found
+
+
+# None when both boards agree to depth, else the first difference as a dict with the turns
+# played to reach it (path), the position and what differs
+def differential(first, second, piece, depth, path=()):
+    if rows_of(first) != rows_of(second) or (first.triangle, first.circle) != (second.triangle, second.circle):
+        return {'path': path, 'reason': 'positions differ', 'rows': (rows_of(first), rows_of(second)),
+                'pieces': ((first.triangle, first.circle), (second.triangle, second.circle))}
+    if depth == 0 or not first.triangle or not first.circle:
+        return None
+    first_children = children(first, piece)
+    second_children = children(second, piece)
+    only_first = [first_children[key][0] for key in first_children if key not in second_children]
+    only_second = [second_children[key][0] for key in second_children if key not in first_children]
+    if only_first or only_second:
+        return {'path': path, 'reason': 'turns differ', 'rows': rows_of(first), 'piece': piece,
+                'only_first': only_first, 'only_second': only_second}
+    for key, (turn, triangle, circle) in first_children.items():
+        if second_children[key][1:] != (triangle, circle):
+            return {'path': path + (turn,), 'reason': 'piece counts differ', 'rows': key,
+                    'pieces': ((triangle, circle), second_children[key][1:])}
+        first_undos = play(first, turn)
+        second_undos = play(second, second_children[key][0])
+        found = differential(first, second, opponent_of(piece), depth - 1, path + (turn,))
+        take_back(second, second_undos)
+        take_back(first, first_undos)
+        if found is not None:
+            return found
+    return None
+
+
+# random games to the end, both boards checked one turn deep after every turn
+def random_differential(first, second, piece, total_moves, games, rng):
+    for _ in range(games):
+        undos = []
+        path = ()
+        side = piece
+        while first.triangle and first.circle and total_moves + len(path) < MAX_TURNS:
+            found = differential(first, second, side, 1, path)
+            if found is not None:
+                return found
+            second_turns = children(second, side)
+            turn = rng.choice(turns_of(first, side))
+            first_undos = play(first, turn)
+            undos.append((first_undos, play(second, second_turns[rows_of(first)][0])))
+            path += (turn,)
+            side = opponent_of(side)
+        for first_undos, second_undos in reversed(undos):
+            take_back(second, second_undos)
+            take_back(first, first_undos)
+    return None
+
+
+def describe(found):
+    lines = [f"diverged: {found['reason']} after {len(found['path'])} turns"]
+    if found['path']:
+        lines.append("  turns: " + " | ".join(" ".join(f"{src}->{dst}" for src, dst in turn) for turn in found['path']))
+    for key, value in found.items():
+        if key not in ('reason', 'path'):
+            lines.append(f"  {key}: {value}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft counts and board differential checks")
+    parser.add_argument('--depth', type=int, default=2, help='depth in whole turns')
+    parser.add_argument('--board', choices=BOARDS, default='bitboard', help='board implementation to count with')
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--position', default=None, help='only the corpus position with this name')
+    parser.add_argument('--rows', default=None, help="a position as '/' separated rows instead of the corpus")
+    parser.add_argument('--moves', type=int, default=0, help='move count of --rows, T is to move when even')
+    parser.add_argument('--diff', action='store_true', help='compare the grid Board with the BitBoard')
+    parser.add_argument('--random', type=int, default=0, help='random games per position for --diff')
+    parser.add_argument('--seed', type=int, default=2021)
+    args = parser.parse_args(argv)
+
+    if args.rows:
+        positions = [{'name': 'rows', 'board': board_from_rows(args.rows), 'total_moves': args.moves,
+                      'piece': 'T' if args.moves % 2 == 0 else 'O'}]
+    else:
+        positions = [p for p in load_corpus(args.corpus) if args.position in (None, p['name'])]
+        if not positions:
+            print(f"no position named {args.position}", file=sys.stderr)
+            return 2
+
+    if args.diff:
+        rng = random.Random(args.seed)
+        for position in positions:
+            first, second = make_board('grid', position['board']), make_board('bitboard', position['board'])
+            found = differential(first, second, position['piece'], args.depth)
+            if found is None and args.random:
+                found = random_differential(first, second, position['piece'], position['total_moves'], args.random, rng)
+            if found is not None:
+                print(f"{position['name']}: {describe(found)}")
+                return 1
+            print(f"{position['name']}: grid and bitboard agree")
+        return 0
+
+    total_nodes = 0
+    total_time = 0.0
+    for position in positions:
+        board = make_board(args.board, position['board'])
+        started = time.perf_counter()
+        counts = perft(board, position['piece'], args.depth)
+        elapsed = time.perf_counter() - started
+        total_nodes += counts['nodes']
+        total_time += elapsed
+        print(f"{position['name']:24} {counts['nodes']:10} nodes {counts['captures']:8} captures "
+              f"{counts['ended']:6} ended {elapsed * 1000:9.1f} ms")
+    print(f"{args.board} depth {args.depth}: {total_nodes} nodes in {total_time:.2f}s "
+          f"({total_nodes / total_time if total_time else 0:.0f} nodes/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# compact positions and append-only game records
+# a position packs into two integers: the T bitboard with the move count in its top byte and the
+# O bitboard with the side to move (0 T, 1 O) in its top byte, 16 bytes on disk
+# a record file is a header and a stream of tagged records, one byte tag then a fixed size body:
+#   G  a game starts from this position
+#   T  a turn, src and dst of both moves (255 when missing)
+#   P  a position, for data sets that want positions without replaying the turns
+#   E  the game ended with this result
+# games are only ever appended, a reader skips a torn record at the end of the file
+# usage: python records.py games.rec
+import os
+import struct
+import sys
+
+from bitboard import BIT, CELLS, FULL, SIZE, BitBoard
+
+MAGIC = b'SBGREC01'
+POSITION = struct.Struct('<QQ')
+TURN = struct.Struct('<4B')
+RESULT = struct.Struct('<B')
+NO_MOVE = 255
+TOP = CELLS + 7  # the extra fields sit in the top byte of each word
+
+GAME, TURN_TAG, POSITION_TAG, END = b'G', b'T', b'P', b'E'
+BODIES = {GAME: POSITION, TURN_TAG: TURN, POSITION_TAG: POSITION, END: RESULT}
+
+# results in the order of the result byte, the same messages game_result gives
+RESULTS = ("Human wins!", "It's a draw!", "AI wins!")
+
+
+def side_to_move(total_moves):
+    return 'T' if total_moves % 2 == 0 else 'O'
+
+
+# (first, second) integers of a grid Board or BitBoard after total_moves turns
+def pack_position(board, total_moves, piece=None):
+    if board.size != SIZE:
+        raise ValueError(f"Only {SIZE}x{SIZE} positions can be packed, got {board.size}x{board.size}")
+    if not isinstance(board, BitBoard):
+        board = BitBoard.from_board(board)
+    if not 0 <= total_moves < 256:
+        raise ValueError(f"Move count out of range: {total_moves}")
+    piece = piece or side_to_move(total_moves)
+    if piece not in ('T', 'O'):
+        raise ValueError(f"Invalid side to move: {piece}")
+    return board.t | total_moves << TOP, board.o | (piece == 'O') << TOP
+
+
+# (board, total_moves, piece) of packed integers, board_class is BitBoard or the grid Board
+def unpack_position(first, second, board_class=BitBoard):
+    t, o = first & FULL, second & FULL
+    if t & o:
+        raise ValueError("Invalid position: a cell holds both sides")
+    total_moves = first >> TOP
+    piece = 'O' if second >> TOP else 'T'
+    if issubclass(board_class, BitBoard):
+        board = BitBoard.empty(SIZE)
+        board.set_position(t, o)
+    else:
+        board = board_class()
+        board.grid = [['T' if t & BIT[x * SIZE + y] else 'O' if o & BIT[x * SIZE + y] else '.'
+                       for y in range(SIZE)] for x in range(SIZE)]
+        board.triangle, board.circle = t.bit_count(), o.bit_count()
+    return board, total_moves, piece
+
+
+def encode_position(board, total_moves, piece=None):
+    return POSITION.pack(*pack_position(board, total_moves, piece))
+
+
+def decode_position(data, offset=0, board_class=BitBoard):
+    return unpack_position(*POSITION.unpack_from(data, offset), board_class)
+
+
+class GameWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.playing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self, board, total_moves=0):
+        self.file.write(GAME + encode_position(board, total_moves))
+        self.playing = True
+
+    def turn(self, turn):
+        cells = [cell for move in turn for cell in move]
+        if len(cells) > 4:
+            raise ValueError(f"A turn has at most two moves: {turn}")
+        cells += [NO_MOVE] * (4 - len(cells))
+        self.file.write(TURN_TAG + TURN.pack(*cells))
+
+    def position(self, board, total_moves, piece=None):
+        self.file.write(POSITION_TAG + encode_position(board, total_moves, piece))
+
+    # result is one of RESULTS, the game is flushed to disk with it
+    def end(self, result):
+        self.file.write(END + RESULT.pack(RESULTS.index(result)))
+        self.playing = False
+        self.file.flush()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# (tag, value) of every record, values are (board, total_moves, piece) for G and P,
+# a turn for T and a RESULTS message for E
+def read_records(path, board_class=BitBoard):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a game record file")
+    offset = len(MAGIC)
+    while offset < len(data):
+        tag = data[offset:offset + 1]
+        body = BODIES.get(tag)
+        if body is None:
+            raise ValueError(f"{path}: bad record at byte {offset}")
+        if offset + 1 + body.size > len(data):
+            return  # torn write at the end of the file
+        if tag == TURN_TAG:
+            cells = TURN.unpack_from(data, offset + 1)
+            value = tuple((cells[i], cells[i + 1]) for i in (0, 2) if cells[i] != NO_MOVE)
+        elif tag == END:
+            value = RESULTS[RESULT.unpack_from(data, offset + 1)[0]]
+        else:
+            value = decode_position(data, offset + 1, board_class)
+        yield tag, value
+        offset += 1 + body.size
+
+
+# every game as a dict of its start (board, total_moves, piece), turns, recorded positions
+# and result, None for a game that never finished
+def read_games(path, board_class=BitBoard):
+    game = None
+    for tag, value in read_records(path, board_class):
+        if tag == GAME:
+            if game is not None:
+                yield game
+            game = {'start': value, 'turns': [], 'positions': [], 'result': None}
+        elif game is None:
+            raise ValueError(f"{path}: record before the first game")
+        elif tag == TURN_TAG:
+            game['turns'].append(value)
+        elif tag == POSITION_TAG:
+            game['positions'].append(value)
+        else:
+            game['result'] = value
+            yield game
+            game = None
+    if game is not None:
+        yield game
+
+
+# (board, total_moves) of the start and after every turn of a game
+def replay(game):
+    board, total_moves, _ = game['start']
+    board = board.copy()
+    yield board.copy(), total_moves
+    for turn in game['turns']:
+        board.make_turn(turn)
+        total_moves += 1
+        yield board.copy(), total_moves
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python records.py games.rec", file=sys.stderr)
+        return 2
+    games = list(read_games(argv[0]))
+    results = {}
+    for game in games:
+        results[game['result']] = results.get(game['result'], 0) + 1
+    turns = sum(len(game['turns']) for game in games)
+    print(f"{len(games)} games, {turns} turns, {os.path.getsize(argv[0])} bytes")
+    for result, count in results.items():
+        print(f"  {result or 'unfinished'}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# counters for one ai turn, collected when the ai is built with stats=True
+# with stats off the search only pays a None check per expanded node and per leaf evaluation
+# with a parallel root search only the node count includes the worker processes
+import json
+import time
+
+
+class SearchStats:
+    def __init__(self):
+        self.reset()
+
+    # start counting a new turn
+    def reset(self):
+        self.nodes = 0  # every position visited, leaves included
+        self.leaf_evals = 0  # evaluate_board calls
+        self.eval_cache_hits = 0
+        self.expanded = 0  # positions whose turns were searched
+        self.children = 0  # turns searched below those positions
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0  # cutoffs by the first turn tried, the move ordering hit rate
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0  # positions answered from the table without searching
+        self.researches = 0  # null window searches that failed high and were searched again
+        self.aspiration_fails = 0  # root searches that fell outside their aspiration window
+        self.qnodes = 0  # capturing turns searched past the horizon, counted in nodes too
+        self.iterations = []
+        self.time_ms = 0.0
+        self.started = time.perf_counter()
+        self.start_nodes = 0
+        self.start_tt = (0, 0)
+
+    def begin(self, ai):
+        self.reset()
+        self.start_nodes = ai.nodes
+        if ai.tt is not None:
+            self.start_tt = (ai.tt.probes, ai.tt.hits)
+
+    def finish(self, ai):
+        self.time_ms = (time.perf_counter() - self.started) * 1000
+        self.nodes = ai.nodes - self.start_nodes
+        if ai.tt is not None:
+            self.tt_probes = ai.tt.probes - self.start_tt[0]
+            self.tt_hits = ai.tt.hits - self.start_tt[1]
+
+    # a position was expanded, searched turns were tried and cutoff says if the last one failed high
+    def searched(self, searched, cutoff):
+        self.expanded += 1
+        self.children += searched
+        if cutoff:
+            self.cutoffs += 1
+            if searched == 1:
+                self.first_move_cutoffs += 1
+
+    # one root search, completed is False when the time budget stopped it
+    def iteration(self, depth, started, nodes, score, completed=True):
+        self.iterations.append({
+            'depth': depth,
+            'time_ms': (time.perf_counter() - started) * 1000,
+            'nodes': nodes,
+            'score': score,
+            'completed': completed,
+        })
+
+    def branching_factor(self):
+        return self.children / self.expanded if self.expanded else 0.0
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def to_dict(self):
+        return {
+            'nodes': self.nodes,
+            'leaf_evals': self.leaf_evals,
+            'eval_cache_hits': self.eval_cache_hits,
+            'expanded': self.expanded,
+            'branching_factor': self.branching_factor(),
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoff_rate(),
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'researches': self.researches,
+            'aspiration_fails': self.aspiration_fails,
+            'qnodes': self.qnodes,
+            'time_ms': self.time_ms,
+            'nodes_per_s': self.nodes / self.time_ms * 1000 if self.time_ms else 0.0,
+            'iterations': self.iterations,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    # append this turn as one json line
+    def dump(self, path):
+        with open(path, 'a') as f:
+            f.write(self.to_json() + "\n")
+
+    # one line for the gui info label
+    def summary(self):
+        depth = self.iterations[-1]['depth'] if self.iterations else 0
+        rate = self.nodes / self.time_ms * 1000 if self.time_ms else 0.0
+        tt = f"  tt hits {self.tt_hits / self.tt_probes:.0%}" if self.tt_probes else ""
+        return (f"depth {depth}  {self.nodes} nodes in {self.time_ms / 1000:.2f}s ({rate:.0f}/s)  "
+                f"cutoffs {self.cutoffs} ({self.first_move_cutoff_rate():.0%} first){tt}")
@@ -0,0 +1,151 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# headless ai vs ai matches, no tkinter needed
+# games run in parallel processes and every finished game is written as one json line
+# usage: python selfplay.py --games 200 --workers auto --out results.jsonl --t-depth 2 --o-depth 3
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ai import AI
+from bitboard import SIZE, BitBoard
+from game import game_result
+from parallel import SearchGame, resolve_workers
+
+WINNERS = {"AI wins!": "T", "Human wins!": "O"}
+
+
+# play one game, configs are AI keyword arguments (depth, time_budget_ms, weights, ...)
+# the first random_turns turns are random so repeated games between the same configs differ
+def play_game(game_id, t_config, o_config, random_turns=0, seed=None):
+    board = BitBoard()
+    game = SearchGame()
+    rng = random.Random(seed)
+    players = {
+        'T': AI(board, game, piece='T', **t_config),
+        'O': AI(board, game, piece='O', **o_config),
+    }
+    side = 'T'  # the ai side always moves first, as in Game
+    moves = []
+    result = None
+    try:
+        while result is None:
+            started = time.perf_counter()
+            if game.total_moves < random_turns:
+                played = rng.choice(board.legal_turns(side))
+                board.make_turn(played)
+                nodes = depth = 0
+            else:
+                ai = players[side]
+                nodes = ai.nodes
+                played = ai.play_turn()
+                nodes = ai.nodes - nodes
+                depth = ai.completed_depth if ai.time_budget_ms else ai.depth
+            moves.append({
+                'side': side,
+                'turn': [[divmod(src, SIZE), divmod(dst, SIZE)] for src, dst in played or ()],
+                'time_ms': (time.perf_counter() - started) * 1000,
+                'nodes': nodes,
+                'depth': depth,
+            })
+            game.total_moves += 1
+            side = 'O' if side == 'T' else 'T'
+            result = game_result(board, game.total_moves)
+    finally:
+        for ai in players.values():
+            ai.close()
+
+    record = {
+        'game': game_id,
+        'seed': seed,
+        't_config': t_config,
+        'o_config': o_config,
+        'winner': WINNERS.get(result, 'draw'),
+        'result': result,
+        'turns': game.total_moves,
+        'triangle': board.triangle,
+        'circle': board.circle,
+    }
+    for piece in ('T', 'O'):
+        searched = [move for move in moves if move['side'] == piece and move['depth']]
+        record[piece + '_nodes'] = sum(move['nodes'] for move in searched)
+        record[piece + '_time_ms'] = sum(move['time_ms'] for move in searched)
+    record['moves'] = moves
+    return record
+
+
+# run many games and stream one json line per finished game to out
+# with swap_sides the two configs change colours every other game
+def run_match(games, t_config, o_config, out, workers=1, random_turns=2, seed=0, swap_sides=False):
+    jobs = []
+    for game_id in range(games):
+        configs = (t_config, o_config)
+        if swap_sides and game_id % 2:
+            configs = (o_config, t_config)
+        jobs.append((game_id, configs[0], configs[1], random_turns, seed + game_id))
+
+    totals = {'T': 0, 'O': 0, 'draw': 0}
+
+    def write(record):
+        totals[record['winner']] += 1
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    workers = resolve_workers(workers)
+    if workers <= 1:
+        for job in jobs:
+            write(play_game(*job))
+        return totals
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(play_game, *job) for job in jobs]
+        for future in as_completed(futures):
+            write(future.result())
+    return totals
+
+
+def side_config(depth, budget, weights):
+    config = {'depth': depth}
+    if budget:
+        config['time_budget_ms'] = budget
+    if weights:
+        # inline json or a path to a json file
+        if weights.lstrip().startswith('{'):
+            config['weights'] = json.loads(weights)
+        else:
+            with open(weights) as f:
+                config['weights'] = json.load(f)
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless AI vs AI matches")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', default='auto', help='processes to use, or "auto"')
+    parser.add_argument('--out', default='-', help='jsonl file to append to, - for stdout')
+    parser.add_argument('--random-turns', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--swap-sides', action='store_true')
+    for piece in ('t', 'o'):
+        parser.add_argument(f'--{piece}-depth', type=int, default=2)
+        parser.add_argument(f'--{piece}-budget', type=int, default=None, help='time budget per turn in ms')
+        parser.add_argument(f'--{piece}-weights', default=None, help='json object or json file')
+    args = parser.parse_args(argv)
+
+    t_config = side_config(args.t_depth, args.t_budget, args.t_weights)
+    o_config = side_config(args.o_depth, args.o_budget, args.o_weights)
+    out = sys.stdout if args.out == '-' else open(args.out, 'a')
+    try:
+        totals = run_match(args.games, t_config, o_config, out, args.workers, args.random_turns,
+                           args.seed, args.swap_sides)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"T wins: {totals['T']}  O wins: {totals['O']}  draws: {totals['draw']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# headless game server: many games in one process with asyncio, no tkinter needed
+# clients send one json object per line over a local tcp socket, or await Server.request in process
+#   {"op": "new", "size": 7, "pieces": 4, "depth": 2, "time_ms": 500}  a game, the ai plays first
+#   {"op": "move", "session": 1, "moves": [[x, y, new_x, new_y], ...], "time_ms": 500}  a human turn
+#   {"op": "ai", "session": 1}  the ai plays a turn it still owes, after an error
+#   {"op": "state", "session": 1}  {"op": "close", "session": 1}  {"op": "metrics"}
+# every answer has "ok", a failed request an "error" message instead
+# ai turns run on a process pool with one search per worker at a time, at most max_pending of them
+# may wait or run, further turns are turned away before the human turn is played (backpressure)
+# usage: python server.py --port 8765 --workers auto --max-pending 64
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ai import AI
+from bitboard import BitBoard
+from game import engine_tables, game_result
+from human import Human
+from layout import STANDARD, default_layout
+from parallel import SearchGame, resolve_workers
+
+# slowest time budget a request may ask for
+MAX_TIME_MS = 10000
+
+# queue waits and search times kept for the latency percentiles
+LATENCY_SAMPLES = 1000
+
+_engines = {}  # (AI, opening book) per layout inside each worker process
+
+
+# the worker's AI and book for a layout, built with the same tables as Game on first use
+def _engine(size, pieces):
+    engine = _engines.get((size, pieces))
+    if engine is None:
+        book, tablebase, weights = engine_tables(default_layout(size, pieces))
+        engine = AI(BitBoard.empty(size), SearchGame(), tablebase=tablebase, weights=weights), book
+        _engines[size, pieces] = engine
+    return engine
+
+
+# the book only answers for sessions at the server's default depth, its turns would play
+# a session that asked for another depth stronger or weaker than it asked for
+def _search(task):
+    t, o, size, pieces, total_moves, depth, time_ms, use_book = task
+    ai, book = _engine(size, pieces)
+    ai.book = book if use_book else None
+    board = ai.board
+    board.set_position(t, o)
+    ai.game.total_moves = total_moves
+    ai.depth = depth
+    ai.time_budget_ms = time_ms
+    started = time.perf_counter()
+    turn = ai.choose_turn()
+    return turn, (time.perf_counter() - started) * 1000
+
+
+# the server is full, the request was not started
+class ServerBusy(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, session_id, layout, depth, time_ms):
+        self.id = session_id
+        self.layout = layout
+        self.pieces = len(layout.t_cells)
+        self.board = BitBoard(layout)
+        self.human = Human(self.board, self)
+        self.total_moves = 0
+        self.depth = depth
+        self.time_ms = time_ms
+        self.result = None
+        self.lock = asyncio.Lock()  # one request of a session at a time
+
+    def return_total_moves(self):
+        return self.total_moves
+
+    def ai_to_move(self):
+        return self.result is None and self.total_moves % 2 == 0
+
+    def state(self):
+        return {
+            'session': self.id,
+            'board': [''.join(row) for row in self.board.grid],
+            'total_moves': self.total_moves,
+            'turn': None if self.result else 'AI' if self.ai_to_move() else 'Human',
+            'result': self.result,
+        }
+
+    # check the moves of a human turn with Human.validate_move_coords and play them, or raise
+    # ValueError and leave the board as it was
+    # a turn is two moves by different pieces, fewer only when no other piece can move
+    def play_human_turn(self, moves):
+        if self.result is not None:
+            raise ValueError("The game is over")
+        if self.ai_to_move():
+            raise ValueError("It is the AI's turn")
+        if not isinstance(moves, list) or any(not isinstance(move, list) or len(move) != 4 or
+                                                 any(not isinstance(v, int) for v in move) for move in moves):
+            raise ValueError("Moves are [x, y, new_x, new_y] lists")
+        if len(moves) > 2:
+            raise ValueError("A turn has at most two moves")
+        size = self.board.size
+        undos = []
+        moved = set()
+        try:
+            for move in moves:
+                x, y, new_x, new_y = move
+                if (x, y) in moved:
+                    raise ValueError(f"The piece at ({x}, {y}) was already moved this turn")
+                if abs(x - new_x) + abs(y - new_y) != 1 or not self.board.is_valid_position(x, y) \
+                        or self.board.piece_at(x, y) != 'O' or not self.human.validate_move_coords(x, y, new_x, new_y):
+                    raise ValueError(f"Invalid move from ({x}, {y}) to ({new_x}, {new_y})")
+                undos.append(self.board.make_move(x * size + y, new_x * size + new_y))
+                moved.add((new_x, new_y))
+            if len(moves) < 2 and self.board.triangle and any(
+                    divmod(src, size) not in moved for src, _ in self.board.legal_moves('O')):
+                raise ValueError("Another piece can still move")
+        except ValueError:
+            for undo in reversed(undos):
+                self.board.unmake_move(undo)
+            raise
+        self.end_turn()
+        return [list(move) for move in moves]
+
+    def play_ai_turn(self, turn):
+        self.board.make_turn(turn)
+        self.end_turn()
+
+    def end_turn(self):
+        self.total_moves += 1
+        self.result = game_result(self.board, self.total_moves)
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.ai_turns = 0
+        self.queue_ms = deque(maxlen=LATENCY_SAMPLES)  # time ai turns waited for a worker
+        self.search_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def to_dict(self, server):
+        return {
+            'sessions': len(server.sessions),
+            'pending': server.pending,
+            'workers': server.workers,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'ai_turns': self.ai_turns,
+            'queue_ms': percentiles(self.queue_ms),
+            'search_ms': percentiles(self.search_ms),
+        }
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+    return {'mean': sum(ordered) / len(ordered), 'p50': pick(0.5), 'p95': pick(0.95), 'max': ordered[-1]}
+
+
+class Server:
+    def __init__(self, workers="auto", max_pending=64, max_sessions=1000, depth=2, time_ms=None):
+        # workers is the number of search processes, "auto" uses every core
+        # max_pending caps the ai turns waiting for or using a worker, max_sessions the open games
+        # depth and time_ms are the defaults of new sessions, time_ms None searches to depth
+        self.workers = resolve_workers(workers)
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self.depth = depth
+        self.time_ms = time_ms
+        self.pending = 0
+        self.sessions = {}
+        self.next_id = 1
+        self.metrics = Metrics()
+
+    # answer one request dict, errors are answered rather than raised
+    async def request(self, message):
+        self.metrics.requests += 1
+        try:
+            if not isinstance(message, dict):
+                raise ValueError("A request is a json object")
+            handler = getattr(self, 'op_' + str(message.get('op')), None)
+            if handler is None:
+                raise ValueError(f"Unknown op: {message.get('op')}")
+            return dict(await handler(message), ok=True)
+        except ServerBusy:
+            self.metrics.rejected += 1
+            return {'ok': False, 'error': "Server busy, try again later"}
+        except ValueError as error:
+            self.metrics.errors += 1
+            return {'ok': False, 'error': str(error)}
+        except Exception as error:
+            # a failed search leaves the session with the ai to move, op ai retries it
+            self.metrics.errors += 1
+            return {'ok': False, 'error': f"Internal error: {error!r}"}
+
+    def session(self, message):
+        session = self.sessions.get(message.get('session'))
+        if session is None:
+            raise ValueError(f"No session {message.get('session')}")
+        return session
+
+    def time_budget(self, message, default):
+        time_ms = message.get('time_ms', default)
+        if time_ms is None:
+            return None
+        if not isinstance(time_ms, (int, float)) or isinstance(time_ms, bool) or not 0 < time_ms <= MAX_TIME_MS:
+            raise ValueError(f"time_ms must be between 0 and {MAX_TIME_MS}")
+        return time_ms
+
+    def check_capacity(self):
+        if self.pending >= self.max_pending:
+            raise ServerBusy()
+
+    async def op_new(self, message):
+        if len(self.sessions) >= self.max_sessions:
+            raise ServerBusy()
+        self.check_capacity()
+        size, pieces = message.get('size', STANDARD.size), message.get('pieces', len(STANDARD.t_cells))
+        depth = message.get('depth', self.depth)
+        if not isinstance(depth, int) or isinstance(depth, bool) or not 1 <= depth <= 6:
+            raise ValueError("depth must be between 1 and 6")
+        if any(not isinstance(n, int) or isinstance(n, bool) for n in (size, pieces)) or not 3 <= size <= 16:
+            raise ValueError("size and pieces must be integers, size between 3 and 16")
+        if not 1 <= pieces <= size * size // 4:
+            raise ValueError(f"pieces must be between 1 and {size * size // 4} on a {size}x{size} board")
+        session = Session(self.next_id, default_layout(size, pieces), depth, self.time_budget(message, self.time_ms))
+        self.next_id += 1
+        self.sessions[session.id] = session
+        async with session.lock:
+            turn = await self.ai_turn(session, session.time_ms)
+            return dict(session.state(), ai_turn=turn)
+
+    async def op_move(self, message):
+        session = self.session(message)
+        time_ms = self.time_budget(message, session.time_ms)
+        async with session.lock:
+            self.check_capacity()
+            moves = session.play_human_turn(message.get('moves', []))
+            turn = await self.ai_turn(session, time_ms) if session.ai_to_move() else None
+            return dict(session.state(), human_turn=moves, ai_turn=turn)
+
+    async def op_ai(self, message):
+        session = self.session(message)
+        async with session.lock:
+            if not session.ai_to_move():
+                raise ValueError("It is not the AI's turn")
+            self.check_capacity()
+            turn = await self.ai_turn(session, self.time_budget(message, session.time_ms))
+            return dict(session.state(), ai_turn=turn)
+
+    async def op_state(self, message):
+        return self.session(message).state()
+
+    async def op_close(self, message):
+        return self.sessions.pop(self.session(message).id).state()
+
+    async def op_metrics(self, message):
+        return self.metrics.to_dict(self)
+
+    # search the session's position on the pool and play the turn, as [[x, y, new_x, new_y], ...]
+    async def ai_turn(self, session, time_ms):
+        self.check_capacity()
+        self.pending += 1
+        queued = time.perf_counter()
+        try:
+            async with self.slots:
+                self.metrics.queue_ms.append((time.perf_counter() - queued) * 1000)
+                board = session.board
+                task = (board.t, board.o, board.size, session.pieces, session.total_moves, session.depth, time_ms,
+                        session.depth == self.depth)
+                turn, search_ms = await asyncio.get_running_loop().run_in_executor(self.executor, _search, task)
+        finally:
+            self.pending -= 1
+        self.metrics.search_ms.append(search_ms)
+        self.metrics.ai_turns += 1
+        session.play_ai_turn(turn)
+        size = session.board.size
+        return [[*divmod(src, size), *divmod(dst, size)] for src, dst in turn]
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    answer = {'ok': False, 'error': "Requests are json, one per line"}
+                else:
+                    answer = await self.request(message)
+                writer.write(json.dumps(answer).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', default='auto', help='search processes, or "auto"')
+    parser.add_argument('--max-pending', type=int, default=64, help='ai turns queued or running before requests are refused')
+    parser.add_argument('--max-sessions', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=2, help='search depth of new games')
+    parser.add_argument('--time-ms', type=float, default=None, help='time budget per ai turn of new games')
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = Server(args.workers, args.max_pending, args.max_sessions, args.depth, args.time_ms)
+        try:
+            print(f"serving on {args.host}:{args.port} with {server.workers} workers", file=sys.stderr)
+            await server.serve(args.host, args.port)
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
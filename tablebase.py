@@ -0,0 +1,193 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# endgame tablebase: the exact result of every position with few pieces left, for either side to move
+# and any number of turns left before the turn limit
+# solved backwards over the turns left: with none left, or a side without pieces, the side with more
+# pieces wins, with r left the side to move picks its best result over its turns with r - 1 left
+# after some r the results stop changing, only the layers up to there are stored and
+# probes with more turns left read the last one
+# file: header, material table, then per layer and side to move a 2 bit result for every position,
+# positions of one material are numbered by the combinatorial rank of their T and O cells
+# the file is mmapped, a probe is an index computation and one byte read
+# usage: python tablebase.py --max-pieces 3 --out endgame.tb
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import combinations
+from math import comb
+
+from bitboard import BIT, CELLS, BitBoard, bits
+from constants import MAX_TURNS
+
+MAGIC = b'SBGTB001'
+HEADER = struct.Struct('<8sHHH')  # magic, max pieces, layers, materials
+MATERIAL = struct.Struct('<BBI')  # T pieces, O pieces, positions
+DEFAULT_TABLEBASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'endgame.tb')
+
+# results, from T's point of view
+O_WINS, DRAW, T_WINS = 0, 1, 2
+
+COMB = [[comb(n, k) for k in range(5)] for n in range(CELLS + 1)]
+
+
+def materials(max_pieces):
+    return [(t, o) for t in range(1, 5) for o in range(1, 5) if t + o <= max_pieces]
+
+
+def material_size(t, o):
+    return COMB[CELLS][t] * COMB[CELLS - t][o]
+
+
+# rank of a sorted cell list among all cell sets of its size (colex order)
+def rank(cells):
+    return sum(COMB[c][i + 1] for i, c in enumerate(cells))
+
+
+# number of the position within its material, O cells are counted among the cells T leaves free
+def position_index(t, o, t_count, o_count):
+    o_cells = [c - (t & (BIT[c] - 1)).bit_count() for c in bits(o)]
+    return rank(list(bits(t))) * COMB[CELLS - t_count][o_count] + rank(o_cells)
+
+
+# result of a finished game, the side with more pieces wins
+def count_result(t_count, o_count):
+    return T_WINS if t_count > o_count else O_WINS if t_count < o_count else DRAW
+
+
+class EndgameTable:
+    def __init__(self, path=DEFAULT_TABLEBASE):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not an endgame tablebase")
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.max_pieces, self.layers, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.data.close()
+            raise ValueError(f"{path} is not an endgame tablebase")
+        self.offsets = {}
+        self.positions = 0
+        for i in range(count):
+            t, o, positions = MATERIAL.unpack_from(self.data, HEADER.size + i * MATERIAL.size)
+            self.offsets[(t, o)] = self.positions
+            self.positions += positions
+        self.block = (self.positions + 3) // 4
+        self.start = HEADER.size + count * MATERIAL.size
+        if size != self.start + self.layers * 2 * self.block:
+            self.data.close()
+            raise ValueError(f"{path} is truncated")
+
+    # the mmap can't be pickled, worker processes open the file again
+    def __reduce__(self):
+        return self.__class__, (self.path,)
+
+    # result (O_WINS, DRAW or T_WINS) with piece to move and turns_left turns before the limit,
+    # None when the position has more pieces than the table
+    def probe(self, board, piece, turns_left):
+        t_count, o_count = board.triangle, board.circle
+        if t_count == 0 or o_count == 0 or turns_left <= 0:
+            return count_result(t_count, o_count)
+        offset = self.offsets.get((t_count, o_count))
+        if offset is None:
+            return None
+        index = offset + position_index(board.t, board.o, t_count, o_count)
+        layer = min(turns_left, self.layers) - 1
+        side = 0 if piece == 'T' else 1
+        byte = self.data[self.start + (layer * 2 + side) * self.block + (index >> 2)]
+        return (byte >> ((index & 3) * 2)) & 3
+
+    def close(self):
+        self.data.close()
+
+
+# solve every position with at most max_pieces pieces, returns (materials, layers)
+# every layer is a bytearray: T to move results, then O to move results, in position index order
+def solve(max_pieces, log=None):
+    table = materials(max_pieces)
+    offsets = {}
+    total = 0
+    for material in table:
+        offsets[material] = total
+        total += material_size(*material)
+    # state ids: T to move 0..total-1, O to move total..2*total-1, then three finished game results
+    finished = 2 * total
+    children = [None] * finished
+    first = bytearray(finished + 3)
+    first[finished:] = bytes((O_WINS, DRAW, T_WINS))
+    board = BitBoard()
+    for t_count, o_count in table:
+        base = offsets[(t_count, o_count)]
+        for t_cells in combinations(range(CELLS), t_count):
+            t = sum(BIT[c] for c in t_cells)
+            free = [c for c in range(CELLS) if not t & BIT[c]]
+            for o_rel in combinations(range(CELLS - t_count), o_count):
+                o = sum(BIT[free[c]] for c in o_rel)
+                index = base + rank(t_cells) * COMB[CELLS - t_count][o_count] + rank(o_rel)
+                first[index] = first[total + index] = count_result(t_count, o_count)
+                for side, piece in ((0, 'T'), (1, 'O')):
+                    board.t, board.o = t, o
+                    board.triangle, board.circle = t_count, o_count
+                    kids = set()
+                    for _ in board.iter_turns(piece):
+                        ct, co = board.triangle, board.circle
+                        if ct == 0 or co == 0:
+                            kids.add(finished + count_result(ct, co))
+                        else:
+                            kids.add((1 - side) * total + offsets[(ct, co)] + position_index(board.t, board.o, ct, co))
+                    children[side * total + index] = array('i', kids)
+        if log:
+            log(f"material {t_count}v{o_count}: moves generated")
+
+    layers = []
+    previous = first
+    for turns_left in range(1, MAX_TURNS + 1):
+        current = bytearray(previous)
+        results = previous.__getitem__
+        for state in range(total):
+            current[state] = max(map(results, children[state]))
+        for state in range(total, finished):
+            current[state] = min(map(results, children[state]))
+        layers.append(current)
+        if log:
+            log(f"{turns_left} turns left solved")
+        if current == previous:
+            break
+        previous = current
+    return table, [layer[:finished] for layer in layers]
+
+
+def pack(results):
+    packed = bytearray((len(results) + 3) // 4)
+    for i, result in enumerate(results):
+        packed[i >> 2] |= result << ((i & 3) * 2)
+    return packed
+
+
+def write_tablebase(path, max_pieces, table, layers):
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, max_pieces, len(layers), len(table)))
+        for t_count, o_count in table:
+            f.write(MATERIAL.pack(t_count, o_count, material_size(t_count, o_count)))
+        for layer in layers:
+            half = len(layer) // 2
+            f.write(pack(layer[:half]))
+            f.write(pack(layer[half:]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the endgame tablebase")
+    parser.add_argument('--max-pieces', type=int, default=3, help='most pieces on the board, both sides together')
+    parser.add_argument('--out', default=DEFAULT_TABLEBASE)
+    args = parser.parse_args(argv)
+    log = lambda text: print(text, file=sys.stderr)
+    table, layers = solve(args.max_pieces, log)
+    write_tablebase(args.out, args.max_pieces, table, layers)
+    log(f"wrote {len(layers)} layers of {len(layers[0]) // 2} positions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
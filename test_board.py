@@ -0,0 +1,94 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# checks of the boards and the search that runs on them, run with python -m pytest
+# make_move/unmake_move must give back exactly the board they started from, the bitboard
+# must capture what the grid Board captures, and a search with verify on must not trip
+import copy
+import random
+
+from ai import AI
+from benchmark import load_corpus
+from bitboard import BitBoard
+from board import Board
+from parallel import SearchGame
+from perft import differential, make_board, random_differential, reference_moves
+
+
+# everything a move can change, the shared lookup tables are left out
+def board_state(board):
+    return {key: value for key, value in vars(board).items() if key not in ('rays', 'geo')}
+
+
+def moves_of(board, piece):
+    if isinstance(board, BitBoard):
+        return board.legal_moves(piece)
+    return reference_moves(board, piece)
+
+
+# random games to the end, every move is taken back and compared with a deep copy first
+def check_round_trips(board, rng, games=5):
+    for _ in range(games):
+        undos = []
+        piece = 'T'
+        while board.triangle and board.circle and len(undos) < 100:
+            moves = moves_of(board, piece)
+            if not moves:
+                break
+            before = copy.deepcopy(board)
+            undo = board.make_move(*rng.choice(moves))
+            after = copy.deepcopy(board)
+            board.unmake_move(undo)
+            assert board_state(board) == board_state(before)
+            board.make_move(*undo[:2])
+            assert board_state(board) == board_state(after)
+            undos.append(undo)
+            if len(undos) % 2 == 0:
+                piece = 'O' if piece == 'T' else 'T'
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        assert board_state(board) == board_state(type(board)())
+
+
+def test_grid_board_round_trips():
+    check_round_trips(Board(), random.Random(1))
+
+
+def test_bitboard_round_trips():
+    board = BitBoard()
+    check_round_trips(board, random.Random(1))
+    assert board.hash == board.compute_hash()
+
+
+def test_bitboard_turn_round_trips():
+    rng = random.Random(2)
+    board = BitBoard()
+    for piece in 'TOTOTOTO':
+        before = copy.deepcopy(board)
+        for turn in board.legal_turns(piece):
+            undos = board.make_turn(turn)
+            assert board.hash == board.compute_hash()
+            board.unmake_turn(undos)
+            assert board_state(board) == board_state(before)
+        board.make_turn(rng.choice(board.legal_turns(piece)))
+
+
+# the grid Board and the bitboard reach the same positions with the same captures
+def test_captures_match_grid_board():
+    for position in load_corpus():
+        grid, bitboard = make_board('grid', position['board']), make_board('bitboard', position['board'])
+        assert differential(grid, bitboard, position['piece'], 1) is None, position['name']
+    assert random_differential(Board(), BitBoard(), 'T', 0, 2, random.Random(3)) is None
+
+
+# verify checks the incremental hash, unmake and evaluation at every node of the search
+def test_search_with_verify():
+    board = BitBoard()
+    game = SearchGame()
+    ai = AI(board, game, depth=2, verify=True)
+    for _ in range(3):
+        ai.prepare_tables()
+        turn, _ = ai.search_root(2)
+        assert turn in board.legal_turns('T')
+        board.make_turn(turn)
+        board.make_turn(random.Random(game.total_moves).choice(board.legal_turns('O')))
+        game.total_moves += 2
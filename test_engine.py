@@ -0,0 +1,112 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# checks of the tables the search reads, run with python -m pytest
+# the endgame tablebase must know the results that follow from the piece counts, and the
+# search must score the positions it knows with it, at inner nodes and leaves alike
+# the transposition table must keep one entry per position and only cut off inside its bounds
+# the opening book must hold a legal turn for every position of the tree it was built from
+from ai import TABLEBASE_WIN, AI
+from bitboard import SIZE, BitBoard
+from book import OpeningBook
+from parallel import SearchGame
+from tablebase import DRAW, O_WINS, T_WINS, EndgameTable
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+
+def cell(x, y):
+    return x * SIZE + y
+
+
+def position(t_cells, o_cells):
+    board = BitBoard.empty()
+    board.set_position(sum(1 << c for c in t_cells), sum(1 << c for c in o_cells))
+    return board
+
+
+# keys 1, 5 and 9 share a bucket of an 8 entry table
+def test_transposition_replacement():
+    tt = TranspositionTable(8)
+    tt.store(1, 3, 1.0, EXACT, 'a')
+    tt.store(5, 1, 2.0, LOWER, 'b')
+    assert tt.probe(1) == (1, 3, 1.0, EXACT, 'a') and tt.probe(5) == (5, 1, 2.0, LOWER, 'b')
+    # a new result for a stored position replaces it, even from a shallower search
+    tt.store(1, 1, 3.0, UPPER, 'c')
+    assert tt.probe(1) == (1, 1, 3.0, UPPER, 'c') and len(tt) == 2
+    # a deeper search takes the deep slot, the entry there moves to the other slot and pushes 5 out
+    tt.store(9, 2, 4.0, EXACT, 'd')
+    assert tt.probe(9)[1] == 2 and tt.probe(1)[1] == 1 and tt.probe(5) is None
+    assert tt.overwrites == 1
+    tt.store(1, 0, 5.0, EXACT, 'e')
+    assert tt.probe(1) == (1, 0, 5.0, EXACT, 'e') and len(tt) == 2 and tt.overwrites == 1
+
+
+# a stored score cuts off only at its own depth and only when its bound settles the window
+def test_transposition_bounds():
+    ai = AI(BitBoard(), SearchGame())
+    ai.root_depth = 2
+    inf = float('inf')
+    ai.store_tt(1, 2, 5.0, 0.0, 10.0, 'a')
+    assert ai.probe_tt(1, 2, -inf, inf) == (5.0, -inf, inf, 'a')
+    assert ai.probe_tt(1, 1, -inf, inf) == (None, -inf, inf, 'a')
+    ai.store_tt(2, 2, 12.0, 0.0, 10.0, 'b')
+    assert ai.tt.probe(2)[3] == LOWER
+    assert ai.probe_tt(2, 2, 0.0, 11.0)[0] == 12.0
+    assert ai.probe_tt(2, 2, 0.0, 20.0) == (None, 12.0, 20.0, 'b')
+    ai.store_tt(3, 2, -1.0, 0.0, 10.0, 'c')
+    assert ai.tt.probe(3)[3] == UPPER
+    assert ai.probe_tt(3, 2, 0.0, 10.0)[0] == -1.0
+    assert ai.probe_tt(3, 2, -5.0, 10.0) == (None, -5.0, -1.0, 'c')
+
+
+# a single piece can never capture, so the side with two pieces wins whoever moves, one against one is a draw
+def test_tablebase_probe():
+    table = EndgameTable()
+    won = position([cell(0, 0), cell(6, 6)], [cell(3, 3)])
+    lost = position([cell(3, 3)], [cell(0, 0), cell(6, 6)])
+    level = position([cell(0, 0)], [cell(6, 6)])
+    for piece in 'TO':
+        assert table.probe(won, piece, 10) == T_WINS
+        assert table.probe(lost, piece, 10) == O_WINS
+        assert table.probe(level, piece, 10) == DRAW
+    assert table.probe(position([cell(0, 0), cell(6, 6)], [cell(0, 6), cell(6, 0)]), 'T', 10) is None
+
+
+# a draw scores what the evaluation gives a level position, here both pieces sit in mirrored corners
+def test_tablebase_draw_score():
+    ai = AI(position([cell(0, 0)], [cell(6, 6)]), SearchGame(10), tablebase=EndgameTable())
+    ai.prepare_tables()
+    assert ai.tablebase_score(0, True) == ai.evaluate_board()
+
+
+# T captures the O piece on (3, 3) into a won two against one, the leaf after the turn knows it
+def test_search_scores_tablebase_leaves():
+    board = position([cell(3, 2), cell(4, 4)], [cell(3, 3), cell(0, 0)])
+    for quiescence in (True, False):
+        ai = AI(board, SearchGame(), tablebase=EndgameTable(), quiescence=quiescence)
+        ai.prepare_tables()
+        turn, score = ai.search_root(1, parallel=False)
+        assert score == TABLEBASE_WIN - 1
+        undos = board.make_turn(turn)
+        assert board.circle == 1
+        board.unmake_turn(undos)
+
+
+# the shipped book walked the way build_book walks it: T plays the book turn, every O reply is followed
+def test_book_turns_are_legal():
+    book = OpeningBook()
+    frontier = [BitBoard()]
+    found = set()
+    while frontier:
+        board = frontier.pop()
+        entry = book.probe(board, 'T')
+        if entry is None:
+            continue
+        assert entry[0] in board.legal_turns('T')
+        assert book.lookup(board, 'T') == entry[0]
+        found.add(board.hash)
+        board.make_turn(entry[0])
+        for reply in board.legal_turns('O'):
+            undos = board.make_turn(reply)
+            frontier.append(board.copy())
+            board.unmake_turn(undos)
+    assert len(found) == len(book)
@@ -0,0 +1,51 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# checks of the position encoding and the game record files, run with python -m pytest
+# a packed position must unpack to the same board, move count and side to move, and a
+# record file must read back the games written to it, without the torn record at its end
+import random
+
+from bitboard import BitBoard
+from board import Board
+from records import GameWriter, pack_position, read_games, replay, unpack_position
+
+
+def test_position_round_trips():
+    rng = random.Random(4)
+    board = BitBoard()
+    for total_moves in range(20):
+        for piece in (None, 'T', 'O'):
+            first, second = pack_position(board, total_moves, piece)
+            unpacked, moves, side = unpack_position(first, second)
+            assert (unpacked.t, unpacked.o, unpacked.hash) == (board.t, board.o, board.hash)
+            assert (unpacked.triangle, unpacked.circle) == (board.triangle, board.circle)
+            assert moves == total_moves
+            assert side == piece or side == ('T' if total_moves % 2 == 0 else 'O')
+            grid, _, _ = unpack_position(first, second, Board)
+            assert grid.grid == board.grid
+            assert pack_position(grid, total_moves, piece) == (first, second)
+        board.make_turn(rng.choice(board.legal_turns('T' if total_moves % 2 == 0 else 'O')))
+
+
+def test_game_records_round_trip(tmp_path):
+    path = tmp_path / 'games.rec'
+    rng = random.Random(5)
+    board = BitBoard()
+    turns = []
+    with GameWriter(path) as writer:
+        writer.start(board)
+        for total_moves in range(6):
+            turn = rng.choice(board.legal_turns('T' if total_moves % 2 == 0 else 'O'))
+            board.make_turn(turn)
+            writer.turn(turn)
+            turns.append(turn)
+        writer.end("It's a draw!")
+        writer.start(board, 6)
+    with open(path, 'ab') as f:
+        f.write(b'T\x00')
+    games = list(read_games(path))
+    assert [game['result'] for game in games] == ["It's a draw!", None]
+    assert games[0]['turns'] == turns
+    assert [len(game['turns']) for game in games] == [6, 0]
+    final, total_moves = list(replay(games[0]))[-1]
+    assert (final.t, final.o, total_moves) == (board.t, board.o, 6)
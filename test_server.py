@@ -0,0 +1,61 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# checks of the game server requests, run with python -m pytest
+# bad requests must be answered with an error and leave the session as it was,
+# a good human turn must be played and answered with the ai's turn
+import asyncio
+
+from constants import DIRECTIONS
+from server import Server
+
+
+# two moves into empty cells by different O pieces of a board as the server shows it
+def human_turn(rows):
+    grid = [list(row) for row in rows]
+    size = len(grid)
+    moves = []
+    for x in range(size):
+        for y in range(size):
+            if grid[x][y] != 'O' or len(moves) == 2 or [x, y] in [move[2:] for move in moves]:
+                continue
+            for dx, dy in DIRECTIONS.values():
+                if 0 <= x + dx < size and 0 <= y + dy < size and grid[x + dx][y + dy] == '.':
+                    grid[x][y], grid[x + dx][y + dy] = '.', 'O'
+                    moves.append([x, y, x + dx, y + dy])
+                    break
+    return moves
+
+
+async def play(server):
+    errors = []
+    for message in ({'op': 'bogus'}, [], {'op': 'new', 'size': 2}, {'op': 'new', 'size': True},
+                    {'op': 'new', 'pieces': 13}, {'op': 'new', 'depth': 7}, {'op': 'new', 'time_ms': 0},
+                    {'op': 'state', 'session': 99}):
+        answer = await server.request(message)
+        assert not answer['ok'], message
+        errors.append(answer['error'])
+    new = await server.request({'op': 'new', 'depth': 1})
+    assert new['ok'] and new['turn'] == 'Human' and len(new['ai_turn']) == 2
+    session = new['session']
+    for moves in ([[0, 0, 0, 1]], [[0, 6, 1, 6], [1, 6, 2, 6]], [[0, 6, 1]], 'moves'):
+        answer = await server.request({'op': 'move', 'session': session, 'moves': moves})
+        assert not answer['ok'], moves
+    assert (await server.request({'op': 'state', 'session': session}))['board'] == new['board']
+    assert not (await server.request({'op': 'ai', 'session': session}))['ok']
+    move = await server.request({'op': 'move', 'session': session, 'moves': human_turn(new['board'])})
+    assert move['ok'] and move['total_moves'] == 3 and move['turn'] == 'Human'
+    metrics = await server.request({'op': 'metrics'})
+    assert metrics['ai_turns'] == 2 and metrics['errors'] == len(errors) + 5
+    return errors
+
+
+def test_server_requests():
+    async def run():
+        server = Server(workers=1)
+        try:
+            return await play(server)
+        finally:
+            server.close()
+    errors = asyncio.run(run())
+    assert errors[0] == "Unknown op: bogus"
+    assert errors[-1] == "No session 99"
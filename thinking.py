@@ -0,0 +1,99 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# runs the ai search in a background thread so the tk window keeps repainting while the ai thinks
+# the thread searches a copy of the board, progress and the result come back through a queue
+# that the tk main loop polls with root.after, so tk is only ever touched from the main thread
+# the same class ponders: it searches the position after the human reply the ai expects,
+# while the human is still thinking
+import queue
+import threading
+
+from parallel import SearchGame
+
+
+class BackgroundSearch:
+    def __init__(self, ai, root, on_progress, on_done, poll_ms=50):
+        # root is anything with tk's after(ms, callback)
+        # on_progress gets the ai progress dicts, on_done the chosen turn, both on the main thread
+        self.ai = ai
+        self.root = root
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.poll_ms = poll_ms
+        self.queue = queue.Queue()
+        self.thread = None
+        self.board = None
+        self.game = None
+        self.position = None  # (t, o) of the searched position, its board changes while the thread runs
+        self.result = None
+        self.cancelled = False
+        self.finished = False
+
+    # start searching board, the ai works on a copy until the search is over
+    # to ponder, position is the board after the expected reply and total_moves its move count
+    def start(self, board, position=None, total_moves=None, ponder=False):
+        self.board = board
+        self.game = self.ai.game
+        self.ai.board = position if position is not None else board.copy()
+        self.position = (self.ai.board.t, self.ai.board.o)
+        if total_moves is not None:
+            self.ai.game = SearchGame(total_moves)
+        self.ai.progress = lambda info: self.queue.put(('progress', info))
+        self.thread = threading.Thread(target=self.run, args=(ponder,), daemon=True)
+        self.thread.start()
+        self.root.after(self.poll_ms, self.poll)
+
+    def run(self, ponder):
+        try:
+            self.queue.put(('done', self.ai.choose_turn(ponder)))
+        except Exception as error:
+            self.queue.put(('error', error))
+
+    def poll(self):
+        if self.finished:
+            return
+        while True:
+            try:
+                kind, value = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                if not self.cancelled:
+                    self.on_progress(value)
+                continue
+            self.finish()
+            if kind == 'error':
+                raise value
+            self.result = value
+            if not self.cancelled:
+                self.on_done(value)
+            return
+        self.root.after(self.poll_ms, self.poll)
+
+    # the ai goes back to the real board and game once its thread is done with the copy
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.thread.join()
+        self.ai.progress = None
+        self.ai.board = self.board
+        self.ai.game = self.game
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # true when the pondered position is the one on board now
+    def matches(self, board):
+        return self.position == (board.t, board.o)
+
+    # stop now and play the best turn found so far, on_done is called as usual
+    def force_move(self):
+        self.ai.stop()
+
+    # stop and drop the result, on_done is not called
+    # waits for the thread so the ai is free for the next search when this returns
+    def cancel(self):
+        self.cancelled = True
+        self.ai.stop()
+        self.finish()
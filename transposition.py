@@ -0,0 +1,84 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# bounded transposition table for the minimax search
+# every bucket has two slots: one keeps the deepest search seen, the other always takes the newest
+# a position is only ever in one of them, a new result for it replaces the one already stored
+
+# bound types
+EXACT = 0
+LOWER = 1  # score is at least this (search failed high)
+UPPER = 2  # score is at most this (search failed low)
+
+
+class TranspositionTable:
+    def __init__(self, max_entries=1 << 16):
+        # max_entries caps the memory, rounded down to a power of two buckets of two slots
+        buckets = 1
+        while buckets * 4 <= max_entries:
+            buckets *= 2
+        self.max_entries = buckets * 2
+        self.mask = buckets - 1
+        self.clear()
+        self.reset_stats()
+
+    def clear(self):
+        # slots hold (key, depth, score, bound, best_move) tuples
+        self.deep = [None] * (self.mask + 1)
+        self.recent = [None] * (self.mask + 1)
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key):
+        self.probes += 1
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.recent[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, best_move):
+        self.stores += 1
+        index = key & self.mask
+        entry = (key, depth, score, bound, best_move)
+        deep = self.deep[index]
+        if deep is not None and deep[0] == key:
+            # a new result for the position in the deep slot replaces it there, probe reads that slot first
+            self.deep[index] = entry
+        elif deep is None or depth >= deep[1]:
+            # depth-preferred slot, the entry it pushes out moves to the always-replace slot
+            self.deep[index] = entry
+            if deep is not None:
+                self.demote(index, deep)
+        else:
+            self.demote(index, entry)
+
+    def demote(self, index, entry):
+        if self.recent[index] is not None and self.recent[index][0] != entry[0]:
+            self.overwrites += 1
+        self.recent[index] = entry
+
+    def __len__(self):
+        return sum(entry is not None for entry in self.deep) + sum(entry is not None for entry in self.recent)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self):
+        return {
+            'max_entries': self.max_entries,
+            'entries': len(self),
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate(),
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+        }
@@ -0,0 +1,276 @@
+#Kagan Tek - 20210702027 - Strategic Board Game With AI
+
+# offline tuning of the evaluation weights by a texel-style fit on recorded games
+# every position of a finished game is labelled with its result (1 T won, 0.5 draw, 0 O won) and
+# the weights are moved one at a time while the mean squared error of sigmoid(k * score) drops
+# the evaluation is linear in the weights, so each position is reduced to its terms once and
+# the error is summed over chunks of positions in parallel processes
+# the search state goes to a checkpoint after every weight, --resume carries on from it
+# only the scalar weights move unless --cells is given, the cell table overfits small data sets
+# --selfplay plays new games with the current weights first and appends them to the record file
+# usage: python tune.py games.rec --workers auto --checkpoint tune.json --out weights.json
+#        python tune.py games.rec --selfplay 200 --depth 2 --resume
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ai import DEFAULT_WEIGHTS, DEFAULT_WEIGHTS_FILE, load_weights, save_weights
+from bitboard import CELLS, SIZE, BitBoard, bits
+from constants import MAX_TURNS
+from game import game_result
+from parallel import resolve_workers
+from records import GameWriter, read_games, replay
+
+SCALARS = tuple(DEFAULT_WEIGHTS)
+
+# label of a RESULTS message, from T's point of view
+LABELS = {"AI wins!": 1.0, "It's a draw!": 0.5, "Human wins!": 0.0}
+
+# first step of the scalar weights, halved after a pass without a gain down to MIN_STEP
+STEP = 0.1
+MIN_STEP = 0.0125
+
+# the opening turns of self-play games are random, their positions say little about the result
+SKIP_TURNS = 4
+
+_positions = None  # the chunk of positions of a worker process
+
+
+# the evaluation terms of a position that the weights multiply: piece difference, mobility
+# difference, capture potential, moves left and the cells of each side
+def position_terms(board, total_moves):
+    ai_mobility, human_mobility, _, _, ai_capturable, human_capturable = board.evaluation_terms([])
+    return (board.triangle - board.circle, ai_mobility - human_mobility, human_capturable - ai_capturable,
+            max(MAX_TURNS - total_moves, 0), tuple(bits(board.t)), tuple(bits(board.o)))
+
+
+# the score AI.score_board gives a position with these weights
+def score_terms(terms, weights, cells):
+    piece_diff, mobility, capture, moves_left, t_cells, o_cells = terms
+    position = sum(cells[i] for i in t_cells) - sum(cells[i] for i in o_cells)
+    return (piece_diff * weights['piece'] + mobility * weights['mobility'] + position * weights['position'] +
+            capture * weights['capture'] + moves_left * weights['endgame'])
+
+
+def squared_error(positions, weights, k):
+    cells = weights['cells']
+    total = 0.0
+    for terms, label in positions:
+        x = -k * score_terms(terms, weights, cells)
+        predicted = 1.0 / (1.0 + math.exp(x)) if x < 500 else 0.0
+        total += (label - predicted) ** 2
+    return total
+
+
+def _init_worker(positions):
+    global _positions
+    _positions = positions
+
+
+def _chunk_error(task):
+    weights, k = task
+    return squared_error(_positions, weights, k)
+
+
+# (terms, label) of every position after skip turns of the finished games in the record files
+def load_positions(paths, skip=SKIP_TURNS):
+    positions = []
+    for path in paths:
+        for game in read_games(path):
+            label = LABELS.get(game['result'])
+            if label is None:
+                continue
+            for turns, (board, total_moves) in enumerate(replay(game)):
+                if turns >= skip and game_result(board, total_moves) is None:
+                    positions.append((position_terms(board, total_moves), label))
+    return positions
+
+
+class ErrorFunction:
+    def __init__(self, positions, workers=None):
+        # the positions are split over the worker processes once, each call only sends the weights
+        self.count = len(positions)
+        self.positions = positions
+        self.workers = min(resolve_workers(workers), max(len(positions), 1))
+        self.executors = []
+        if self.workers > 1:
+            size = math.ceil(len(positions) / self.workers)
+            for i in range(self.workers):
+                chunk = positions[i * size:(i + 1) * size]
+                self.executors.append(ProcessPoolExecutor(1, initializer=_init_worker, initargs=(chunk,)))
+
+    # mean squared error of the weights over all positions
+    def __call__(self, weights, k):
+        if not self.executors:
+            return squared_error(self.positions, weights, k) / self.count
+        futures = [executor.submit(_chunk_error, (weights, k)) for executor in self.executors]
+        return sum(future.result() for future in futures) / self.count
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
+        self.executors = []
+
+
+# the k that fits the scores of the weights best, by golden section search
+def fit_k(error, weights, low=0.01, high=4.0, rounds=30):
+    ratio = (math.sqrt(5) - 1) / 2
+    a, b = high - ratio * (high - low), low + ratio * (high - low)
+    error_a, error_b = error(weights, a), error(weights, b)
+    for _ in range(rounds):
+        if error_a < error_b:
+            high, b, error_b = b, a, error_a
+            a = high - ratio * (high - low)
+            error_a = error(weights, a)
+        else:
+            low, a, error_a = a, b, error_b
+            b = low + ratio * (high - low)
+            error_b = error(weights, b)
+    return (low + high) / 2
+
+
+# the weights tried, scalars by name and cells by index
+def parameters(tune_cells):
+    return list(SCALARS) + (list(range(CELLS)) if tune_cells else [])
+
+
+def adjusted(weights, parameter, step):
+    trial = dict(weights, cells=list(weights['cells']))
+    if isinstance(parameter, int):
+        trial['cells'][parameter] += 1 if step > 0 else -1
+        if trial['cells'][parameter] < 0:
+            return None
+    else:
+        trial[parameter] = round(trial[parameter] + step, 6)
+    return trial
+
+
+def new_state(weights, positions, k, error):
+    return {'weights': weights, 'k': k, 'error': error, 'positions': positions, 'pass': 0, 'index': 0,
+            'step': STEP, 'improved': False, 'evaluations': 0}
+
+
+def write_checkpoint(state, path):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+# local search: every weight is moved up and down by its step and kept where the error drops
+# a pass without a gain halves the scalar step, the search ends below MIN_STEP or after passes
+def tune(error, state, passes=20, tune_cells=False, checkpoint=None, log=None):
+    params = parameters(tune_cells)
+    while state['pass'] < passes:
+        for index in range(state['index'], len(params)):
+            parameter = params[index]
+            for step in (state['step'], -state['step']):
+                trial = adjusted(state['weights'], parameter, step)
+                if trial is None:
+                    continue
+                trial_error = error(trial, state['k'])
+                state['evaluations'] += 1
+                if trial_error < state['error']:
+                    state['weights'], state['error'], state['improved'] = trial, trial_error, True
+                    break
+            state['index'] = index + 1
+            if checkpoint:
+                write_checkpoint(state, checkpoint)
+        if log:
+            log(f"pass {state['pass'] + 1}: error {state['error']:.6f} step {state['step']}")
+        state['pass'] += 1
+        state['index'] = 0
+        if not state['improved']:
+            if state['step'] / 2 < MIN_STEP:
+                break
+            state['step'] /= 2
+        state['improved'] = False
+        if checkpoint:
+            write_checkpoint(state, checkpoint)
+    return state['weights']
+
+
+def record_game(writer, record):
+    writer.start(BitBoard(), 0)
+    for move in record['moves']:
+        writer.turn(tuple((x * SIZE + y, new_x * SIZE + new_y) for (x, y), (new_x, new_y) in move['turn']))
+    writer.end(record['result'])
+
+
+# self-play games of the weights against themselves, appended to the record file as they finish
+def generate_games(path, games, weights, depth=2, workers=None, random_turns=SKIP_TURNS, seed=0, log=None):
+    from selfplay import play_game
+    config = {'depth': depth, 'weights': weights}
+    jobs = [(game_id, config, config, random_turns, seed + game_id) for game_id in range(games)]
+    with GameWriter(path) as writer:
+        workers = resolve_workers(workers)
+        if workers <= 1:
+            for job in jobs:
+                record_game(writer, play_game(*job))
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                for done, future in enumerate(as_completed([executor.submit(play_game, *job) for job in jobs])):
+                    record_game(writer, future.result())
+                    if log and (done + 1) % 10 == 0:
+                        log(f"{done + 1}/{games} games")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit the evaluation weights to recorded game results")
+    parser.add_argument('records', nargs='+', help='game record files')
+    parser.add_argument('--workers', default='auto', help='processes to use, or "auto"')
+    parser.add_argument('--checkpoint', default='tune.json', help='search state, written after every weight')
+    parser.add_argument('--resume', action='store_true', help='carry on from the checkpoint')
+    parser.add_argument('--out', default=DEFAULT_WEIGHTS_FILE, help='weights file to write')
+    parser.add_argument('--start', default=None, help='weights file to start from, default the built in weights')
+    parser.add_argument('--passes', type=int, default=20)
+    parser.add_argument('--cells', action='store_true', help='tune the cell weights too, they overfit small data sets')
+    parser.add_argument('--skip', type=int, default=SKIP_TURNS, help='opening turns left out of every game')
+    parser.add_argument('--selfplay', type=int, default=0, help='self-play games to add to the first record file')
+    parser.add_argument('--depth', type=int, default=2, help='search depth of the self-play games')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    log = lambda text: print(text, file=sys.stderr)
+
+    if args.resume:
+        with open(args.checkpoint) as f:
+            state = json.load(f)
+        weights = state['weights']
+    else:
+        weights = dict(DEFAULT_WEIGHTS, cells=list(BitBoard().geo.position_weights))
+        if args.start:
+            weights.update(load_weights(args.start))
+    if args.selfplay:
+        started = time.perf_counter()
+        generate_games(args.records[0], args.selfplay, weights, args.depth, args.workers, args.skip, args.seed, log)
+        log(f"{args.selfplay} self-play games in {time.perf_counter() - started:.1f}s")
+
+    positions = load_positions(args.records, args.skip)
+    if not positions:
+        log("no finished games in the record files")
+        return 1
+    error = ErrorFunction(positions, args.workers)
+    try:
+        if not args.resume or state['positions'] != len(positions):
+            if args.resume:
+                log("the record files changed since the checkpoint, starting a new pass from its weights")
+            k = fit_k(error, weights)
+            state = new_state(weights, len(positions), k, error(weights, k))
+        log(f"{len(positions)} positions, k {state['k']:.4f}, error {state['error']:.6f}")
+        started = time.perf_counter()
+        weights = tune(error, state, args.passes, args.cells, args.checkpoint, log)
+    finally:
+        error.close()
+    if not args.cells:
+        weights = {name: weights[name] for name in SCALARS}
+    save_weights(weights, args.out)
+    log(f"error {state['error']:.6f} after {state['evaluations']} evaluations in "
+        f"{time.perf_counter() - started:.1f}s, weights written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())